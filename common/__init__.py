@@ -0,0 +1,2 @@
+# Shared helpers for the AR games (capture sources, diagnostics).
+# Games add the repository root to sys.path and import from here.
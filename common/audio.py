@@ -0,0 +1,217 @@
+# Low-latency sound effects.
+#
+# Clips are decoded to PCM once at startup (mp3 included), the mixer is
+# opened with a small buffer, and a fixed pool of voices is shared between
+# clips by priority: when every voice is busy a new sound takes over the
+# lowest-priority one, or is dropped if all playing sounds matter more.
+# play() only queues the trigger, so the game loop never blocks on audio;
+# a dedicated thread starts the sounds and measures the delay from trigger
+# to the mixer starting the sound (ar_audio_start_delay_seconds). What
+# happens after that isn't observable through pygame: the mixer buffer adds
+# at least BUFFER samples (exported as ar_audio_buffer_seconds, an estimate;
+# SDL may open a larger buffer than requested) and the device its own
+# latency on top.
+#
+# AR_AUDIO_SINK selects the output: unset for the sound card, "null" to
+# discard, or a .wav path to render everything that was played into a file.
+import os
+import queue
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+from common import metrics, trace
+
+FREQUENCY = 44100
+CHANNELS = 2
+BUFFER = 256  # samples per mixer callback, ~6 ms at 44.1 kHz
+
+
+class Clip:
+    def __init__(self, name, pcm, frequency, priority=0):
+        self.name = name
+        self.pcm = pcm  # int16, shape (samples, channels)
+        self.priority = priority
+        self.duration = len(pcm) / float(frequency)
+
+
+def _decode(path, frequency, channels):
+    # SDL_mixer decodes wav/mp3/ogg into the mixer's own sample format.
+    import pygame
+    mixer_frequency, _, mixer_channels = pygame.mixer.get_init()
+    if (mixer_frequency, mixer_channels) != (frequency, channels):
+        raise ValueError("Mixer is {} Hz/{} ch, expected {} Hz/{} ch".format(
+            mixer_frequency, mixer_channels, frequency, channels))
+    pcm = pygame.sndarray.array(pygame.mixer.Sound(path)).astype(np.float32)
+    return pcm.reshape(len(pcm), -1)
+
+
+class SampleBank:
+    def __init__(self, frequency=FREQUENCY, channels=CHANNELS):
+        self.frequency = frequency
+        self.channels = channels
+        self.clips = {}
+
+    def load(self, name, path, priority=0, volume=1.0):
+        pcm = np.clip(_decode(path, self.frequency, self.channels) * volume, -32768, 32767).astype(np.int16)
+        clip = Clip(name, np.ascontiguousarray(pcm), self.frequency, priority)
+        self.clips[name] = clip
+        return clip
+
+
+class PygameSink:
+    # Plays through the sound card with SDL_mixer, opened with a small buffer.
+
+    def __init__(self, frequency=FREQUENCY, channels=CHANNELS, buffer=BUFFER, voices=4):
+        import pygame
+        pygame.mixer.quit()  # pygame.init() may have opened it with the default, large buffer
+        pygame.mixer.init(frequency=frequency, size=-16, channels=channels, buffer=buffer)
+        pygame.mixer.set_num_channels(voices)
+        self.frequency, _, self.channels = pygame.mixer.get_init()
+        self.buffer_seconds = buffer / float(self.frequency)  # requested, not measured
+        self._pygame = pygame
+        self._sounds = {}
+
+    def prepare(self, clip):
+        self._sounds[clip.name] = self._pygame.sndarray.make_sound(clip.pcm)
+
+    def play(self, voice, clip):
+        self._pygame.mixer.Channel(voice).play(self._sounds[clip.name])
+
+    def close(self):
+        pass
+
+
+class NullSink:
+    # Discards audio but remembers what was played, for tests and soak runs.
+
+    def __init__(self, frequency=FREQUENCY, channels=CHANNELS):
+        self.frequency = frequency
+        self.channels = channels
+        self.buffer_seconds = 0.0
+        self.played = deque(maxlen=1000)  # (time, voice, clip name)
+
+    def prepare(self, clip):
+        pass
+
+    def play(self, voice, clip):
+        self.played.append((time.perf_counter(), voice, clip.name))
+
+    def close(self):
+        pass
+
+
+class FileSink(NullSink):
+    # Renders every played clip at the moment it started into a WAV file,
+    # written on close(), so timing can be checked against the game. Meant
+    # for short test runs: only the first max_seconds are rendered, which
+    # bounds the mix buffer (about 100 MB for the default 5 minutes).
+
+    def __init__(self, path, frequency=FREQUENCY, channels=CHANNELS, max_seconds=300):
+        NullSink.__init__(self, frequency, channels)
+        self.path = path
+        self.max_samples = int(max_seconds * frequency)
+        self._start = time.perf_counter()
+        self._events = []
+
+    def play(self, voice, clip):
+        NullSink.play(self, voice, clip)
+        offset = int((time.perf_counter() - self._start) * self.frequency)
+        if offset < self.max_samples:
+            self._events.append((offset, clip.pcm))
+
+    def close(self):
+        length = max([offset + len(pcm) for offset, pcm in self._events] or [0])
+        mix = np.zeros((length, self.channels), np.int32)
+        for offset, pcm in self._events:
+            mix[offset:offset + len(pcm)] += pcm
+        with wave.open(self.path, "wb") as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(2)
+            f.setframerate(self.frequency)
+            f.writeframes(np.clip(mix, -32768, 32767).astype("<i2").tobytes())
+
+
+class AudioEngine:
+    def __init__(self, sink, bank, voices=4, retrigger_interval=0.03):
+        # retrigger_interval: a clip triggered again within this many seconds
+        # is ignored, so hits on consecutive frames don't stack into noise.
+        self.sink = sink
+        self.bank = bank
+        self.retrigger_interval = retrigger_interval
+        self.start_delays = deque(maxlen=1000)  # seconds, most recent triggers
+        self._voices = [(0, 0.0)] * voices  # (priority, end time) per voice
+        self._last_trigger = {}
+        self._queue = queue.SimpleQueue()
+        for clip in bank.clips.values():
+            sink.prepare(clip)
+        metrics.audio_buffer_seconds.set(sink.buffer_seconds)
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self._thread.start()
+
+    def play(self, name):
+        # Called from the game loop; returns immediately.
+        self._queue.put((name, time.perf_counter()))
+
+    def _pick_voice(self, clip, now):
+        free = [i for i, (_, end) in enumerate(self._voices) if end <= now]
+        if free:
+            return free[0]
+        # Steal the lowest-priority voice, the one started first among equals.
+        voice = min(range(len(self._voices)), key=lambda i: (self._voices[i][0], self._voices[i][1]))
+        if self._voices[voice][0] > clip.priority:
+            return None
+        return voice
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, triggered = item
+            clip = self.bank.clips[name]
+            if triggered - self._last_trigger.get(name, -1.0) < self.retrigger_interval:
+                metrics.audio_dropped.inc()
+                continue
+            voice = self._pick_voice(clip, time.perf_counter())
+            if voice is None:
+                metrics.audio_dropped.inc()
+                continue
+            with trace.span("audio.play", clip=name):
+                self.sink.play(voice, clip)
+            started = time.perf_counter()
+            self._voices[voice] = (clip.priority, started + clip.duration)
+            self._last_trigger[name] = triggered
+            self.start_delays.append(started - triggered)
+            metrics.audio_start_delay_seconds.observe(started - triggered)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.sink.close()
+
+
+def open_audio(clips, voices=4):
+    # clips: {name: (path, priority)}. Higher priority wins a busy voice.
+    sink_name = os.environ.get("AR_AUDIO_SINK", "")
+    if sink_name == "":
+        sink = PygameSink(voices=voices)
+    else:
+        # The mixer is still needed to decode the clips, but nothing is
+        # played through it, so it doesn't need a real sound card.
+        import pygame
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=FREQUENCY, size=-16, channels=CHANNELS)
+        frequency, _, channels = pygame.mixer.get_init()
+        if sink_name == "null":
+            sink = NullSink(frequency, channels)
+        else:
+            sink = FileSink(sink_name, frequency, channels)
+    bank = SampleBank(sink.frequency, sink.channels)
+    for name, (path, priority) in clips.items():
+        bank.load(name, path, priority)
+    return AudioEngine(sink, bank, voices=voices)
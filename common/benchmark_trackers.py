@@ -0,0 +1,211 @@
+# Compares the MediaPipe solutions API with the direct TFLite backend on the
+# same recorded clips: per-frame latency, CPU use and detection rate.
+#
+#   python -m common.benchmark_trackers clip.mp4 --task hands --threads 1 2 4
+#   python -m common.benchmark_trackers clip.mp4 --task pose --players 1 2 3 4
+#
+# --players times party mode's ZonePoseTracker instead, per player count.
+# Frames are decoded up front so only tracking is timed. CPU use is process
+# CPU time divided by wall time, i.e. how many cores the tracker kept busy.
+# Every TFLite run is also checked against the solutions API frame by frame:
+# the mean landmark distance in pixels and, for hands, how often the
+# Left/Right labels agree. A fast backend that tracks the wrong thing shows
+# up there rather than as a good time.
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB))
+    cap.release()
+    if not frames:
+        raise IOError("No frames in " + path)
+    return frames
+
+
+def make_tracker(task, backend, threads):
+    if backend == "solutions":
+        import mediapipe as mp
+        if task == "hands":
+            return mp.solutions.hands.Hands(max_num_hands=2)
+        return mp.solutions.pose.Pose()
+    from common.tflite_tracker import TFLiteHands, TFLitePose
+    if task == "hands":
+        return TFLiteHands(max_num_hands=2, num_threads=threads)
+    return TFLitePose(num_threads=threads)
+
+
+def found(task, results):
+    if task == "hands":
+        return bool(results.multi_hand_landmarks)
+    return results.pose_landmarks is not None
+
+
+def landmarks_px(task, results, width, height):
+    # [(label, (n, 2) array of pixel positions)] for each detection. Pose
+    # landmarks the model itself rates as not visible (off-frame legs) are NaN:
+    # both backends only guess those.
+    if task == "hands":
+        if not results.multi_hand_landmarks:
+            return []
+        labels = [h.classification[0].label for h in results.multi_handedness]
+        hands = results.multi_hand_landmarks
+    else:
+        if results.pose_landmarks is None:
+            return []
+        labels, hands = [None], [results.pose_landmarks]
+    scale = np.array([width, height])
+    detections = []
+    for label, landmarks in zip(labels, hands):
+        points = np.array([(p.x, p.y) for p in landmarks.landmark]) * scale
+        if task == "pose":
+            points[[p.visibility < 0.5 for p in landmarks.landmark]] = np.nan
+        detections.append((label, points))
+    return detections
+
+
+def compare(reference, detections):
+    # Pairs each frame's detections with the reference's by nearest first
+    # landmark (wrist / nose); returns (mean pixel distance, label agreement).
+    distances, agree, labelled = [], 0, 0
+    for expected, actual in zip(reference, detections):
+        unused = list(expected)
+        for label, points in actual:
+            if not unused:
+                break
+            match = min(unused, key=lambda e: np.nan_to_num(np.linalg.norm(e[1][0] - points[0]), nan=np.inf))
+            unused.remove(match)
+            distances.extend(np.linalg.norm(match[1] - points, axis=1))
+            if match[0] is not None:
+                agree += match[0] == label
+                labelled += 1
+    error = np.nanmean(distances) if not np.all(np.isnan(distances)) else None
+    return (None if error is None else round(float(error), 2),
+            round(agree / float(labelled), 3) if labelled else None)
+
+
+def run(task, backend, threads, frames, reference=None):
+    tracker = make_tracker(task, backend, threads)
+    tracker.process(frames[0])  # warm-up: graph start, first allocations
+    latencies, detected, outputs = [], 0, []
+    height, width = frames[0].shape[:2]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for frame in frames:
+        start = time.perf_counter()
+        results = tracker.process(frame)
+        latencies.append(time.perf_counter() - start)
+        detected += found(task, results)
+        outputs.append(results)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    tracker.close()
+    detections = [landmarks_px(task, results, width, height) for results in outputs]
+
+    latencies = np.array(latencies) * 1000.0
+    result = {
+        "backend": backend if backend == "solutions" else "tflite/{}t".format(threads),
+        "frames": len(frames),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "mean_ms": round(float(latencies.mean()), 2),
+        "cpu_cores": round(cpu / wall, 2),
+        "detection_rate": round(detected / float(len(frames)), 3),
+        "detections": detections,
+    }
+    if reference is not None:
+        result["error_px"], result["label_agreement"] = compare(reference, detections)
+    for counter in ("palm_runs", "detector_runs"):
+        if hasattr(tracker, counter):
+            result["detector_runs"] = getattr(tracker, counter)
+    return result
+
+
+def run_players(backend, threads, frames, players):
+    from common.pose import ZonePoseTracker
+    tracker = ZonePoseTracker(players, lambda: make_tracker("pose", backend, threads), 0)
+    tracker.process(frames[0])
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        tracker.process(frame)
+        latencies.append(time.perf_counter() - start)
+    tracker.close()
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "backend": backend if backend == "solutions" else "tflite/{}t".format(threads),
+        "players": players,
+        "passes_per_frame": tracker.max_passes,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "mean_ms": round(float(latencies.mean()), 2),
+    }
+
+
+def _cell(value):
+    return "-" if value is None else value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hand/pose tracking backends on recorded clips.")
+    parser.add_argument("clips", nargs="+")
+    parser.add_argument("--task", choices=["hands", "pose"], default="hands")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4],
+                        help="TFLite interpreter thread counts to try")
+    parser.add_argument("--frames", type=int, default=300, help="frames per clip")
+    parser.add_argument("--players", type=int, nargs="+",
+                        help="time ZonePoseTracker at these player counts (pose only)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for clip in args.clips:
+        frames = load_frames(clip, args.frames)
+        if args.players:
+            rows = [run_players(backend, threads, frames, players)
+                    for backend, threads in [("solutions", None), ("tflite", args.threads[0])]
+                    for players in args.players]
+            report[clip] = rows
+            print("{} ({} frames, party mode)".format(clip, len(frames)))
+            print("  {:<12} {:>7} {:>7} {:>8} {:>8} {:>10}".format(
+                "backend", "players", "passes", "p50 ms", "mean ms", "vs {}p".format(args.players[0])))
+            first = {}
+            for row in rows:
+                first.setdefault(row["backend"], row["mean_ms"])
+                print("  {:<12} {:>7} {:>7} {:>8} {:>8} {:>9}x".format(
+                    row["backend"], row["players"], row["passes_per_frame"], row["p50_ms"], row["mean_ms"],
+                    round(row["mean_ms"] / first[row["backend"]], 2)))
+            continue
+        rows = [run(args.task, "solutions", None, frames)]
+        reference = rows[0]["detections"]
+        rows += [run(args.task, "tflite", threads, frames, reference) for threads in args.threads]
+        for row in rows:
+            del row["detections"]
+        report[clip] = rows
+
+        print("{} ({} frames, {})".format(clip, len(frames), args.task))
+        print("  {:<12} {:>8} {:>8} {:>8} {:>6} {:>9} {:>9} {:>7} {:>7}".format(
+            "backend", "p50 ms", "p95 ms", "mean ms", "cores", "detected", "detector", "err px", "labels"))
+        for row in rows:
+            print("  {:<12} {:>8} {:>8} {:>8} {:>6} {:>9} {:>9} {:>7} {:>7}".format(
+                row["backend"], row["p50_ms"], row["p95_ms"], row["mean_ms"], row["cpu_cores"],
+                row["detection_rate"], row.get("detector_runs", "-"),
+                _cell(row.get("error_px")), _cell(row.get("label_agreement"))))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
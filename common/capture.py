@@ -0,0 +1,173 @@
+# Video sources shared by the games.
+#
+# open_capture() returns the webcam by default. Setting AR_SOURCE switches
+# every game to another camera index or to a recorded clip, which is how
+# the soak and benchmark tools drive a game without a person in front of it.
+import os
+import threading
+import time
+
+import cv2
+
+from common import metrics, trace
+
+# Callables run after every successful read(), e.g. the soak monitor.
+_frame_hooks = []
+# Callables that wrap the raw source before anything else sees its frames,
+# e.g. the latency tool's marker injection.
+_source_wrappers = []
+
+
+def add_frame_hook(hook):
+    _frame_hooks.append(hook)
+
+
+def remove_frame_hook(hook):
+    if hook in _frame_hooks:
+        _frame_hooks.remove(hook)
+
+
+def add_source_wrapper(wrapper):
+    _source_wrappers.append(wrapper)
+
+
+class ReplayCapture:
+    # Plays a video file through the cv2.VideoCapture interface.
+    # speed=1.0 keeps the clip's own frame rate, 2.0 plays twice as fast and
+    # 0 returns frames as fast as the game asks for them. With loop=True the
+    # clip rewinds at the end so a game can run for hours from a short clip.
+
+    def __init__(self, path, loop=True, speed=1.0):
+        self.path = path
+        self.loop = loop
+        self.speed = speed
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise IOError("Cannot open replay source: {}".format(path))
+        fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_interval = 1.0 / fps
+        self._next_frame_time = None
+
+    def read(self):
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        if not ret:
+            return ret, frame
+
+        if self.speed > 0:
+            now = time.perf_counter()
+            if self._next_frame_time is None:
+                self._next_frame_time = now
+            delay = self._next_frame_time - now
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind: don't try to catch up with a burst of frames.
+                self._next_frame_time = now
+            self._next_frame_time += self.frame_interval / self.speed
+        return ret, frame
+
+    def set(self, prop_id, value):
+        # Resolution requests are meant for cameras; a clip keeps its size.
+        if prop_id in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            return False
+        return self._cap.set(prop_id, value)
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+class ThreadedCapture:
+    # Reads the wrapped source on a background thread and hands out the newest
+    # frame, so a slow game loop skips stale frames instead of working through
+    # the driver's queue. The thread starts on the first read(), after the
+    # game has finished configuring the camera.
+
+    def __init__(self, cap):
+        self._cap = cap
+        self._cond = threading.Condition()
+        self._latest = (False, None)
+        self._seq = self._read_seq = 0
+        self._running = False
+        self._thread = None
+
+    def _run(self):
+        while self._running:
+            ret, frame = self._cap.read()
+            with self._cond:
+                self._latest = (ret, frame)
+                self._seq += 1
+                self._cond.notify_all()
+            if not ret:
+                time.sleep(0.01)
+
+    def read(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+            self._thread.start()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != self._read_seq, timeout=1.0):
+                return False, None
+            self._read_seq = self._seq
+            return self._latest
+
+    def release(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self._cap.release()
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+class _HookedCapture:
+    # Numbers the frames of the wrapped source (the id tracing spans carry)
+    # and runs the registered frame hooks after each read.
+
+    def __init__(self, cap, frame_period=None):
+        self._cap = cap
+        self.frame_period = frame_period
+        self.frame_id = 0
+
+    def read(self):
+        with trace.span("cap.read", frame=self.frame_id + 1):
+            ret, frame = self._cap.read()
+        if not ret:
+            metrics.capture_failures.inc()
+        else:
+            self.frame_id += 1
+            trace.set_frame(self.frame_id)
+            metrics.on_capture(frame, self.frame_period)
+            for hook in list(_frame_hooks):
+                hook(frame)
+        return ret, frame
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+def open_capture(default=0):
+    # AR_SOURCE: camera index or path to a video file (default: `default`).
+    # AR_REPLAY_SPEED: playback speed for files, 0 for unthrottled.
+    # AR_REPLAY_LOOP: set to 0 to stop at the end of the file.
+    # AR_CAPTURE_THREADED: set to 1 to read frames on a background thread.
+    source = os.environ.get("AR_SOURCE", "")
+    if source == "" or source.isdigit():
+        cap = cv2.VideoCapture(int(source or default))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_period = 1.0 / fps if fps > 0 else None
+    else:
+        speed = float(os.environ.get("AR_REPLAY_SPEED", "1"))
+        loop = os.environ.get("AR_REPLAY_LOOP", "1") != "0"
+        cap = ReplayCapture(source, loop=loop, speed=speed)
+        # Unthrottled replay has no frame rate to fall behind.
+        frame_period = cap.frame_interval / speed if speed > 0 else None
+    for wrap in _source_wrappers:
+        cap = wrap(cap)
+    if os.environ.get("AR_CAPTURE_THREADED", "0") == "1":
+        cap = ThreadedCapture(cap)
+    return _HookedCapture(cap, frame_period)
@@ -0,0 +1,326 @@
+# Motion-to-photon latency.
+#
+# Measures how long a change in front of the camera takes to reach the
+# screen, using only a video clip. While a game runs from the clip, the tool
+# paints a white border on a few frames every second (black on the others),
+# which survives the games' mirroring, resizing, rotation and blending. Each
+# pulse is timestamped when the source produces it, followed through capture,
+# inference and the game's update/draw via the trace spans, and detected
+# again in the image handed to cv2.imshow() or pygame.display.flip().
+# "Photon" here is that hand-off to the window system; the monitor's own
+# scan-out and response time come on top.
+#
+# Every game runs once per pipeline configuration, each in its own process:
+#   python -m common.latency hand-gesture-ping-pong/main.py jumping-challenge/main.py \
+#       --config threaded:AR_CAPTURE_THREADED=1 --config markers:AR_TRACKER=markers
+# Without --source a synthetic clip is generated; a clip of a real player
+# gives more representative inference times. --headless runs without windows.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from common import capture, trace
+from common.soak import SoakComplete, install_headless, percentile, run_game
+
+PULSE_EVERY = 30  # source frames between pulses; latencies must stay below this
+PULSE_FRAMES = 3  # frames each pulse stays lit, so a dropped frame can't hide it
+BORDER = 0.05  # border width as a fraction of the frame's shorter side
+ON_DELTA = 60  # grey levels above the dark border that count as lit
+
+INFERENCE_SPANS = ("hands.process", "pose.process", "markers.detect")
+STAGES = ("capture", "inference", "update_draw", "present")
+
+
+def paint_border(frame, value):
+    h, w = frame.shape[:2]
+    b = max(2, int(min(h, w) * BORDER))
+    frame[:b] = value
+    frame[-b:] = value
+    frame[:, :b] = value
+    frame[:, -b:] = value
+
+
+def border_level(image):
+    # Median brightness along a ring inside the painted border. Scores,
+    # paddles and obstacles drawn over part of the ring don't move the median.
+    h, w = image.shape[:2]
+    d = max(1, int(min(h, w) * BORDER / 2))
+    ring = np.concatenate([image[d, ::4], image[h - 1 - d, ::4], image[::4, d], image[::4, w - 1 - d]])
+    return float(np.median(ring.reshape(len(ring), -1).mean(axis=1)))
+
+
+class _PulseSource:
+    # Wraps the raw source (below threaded capture) and paints the pulses.
+
+    def __init__(self, cap, probe):
+        self._cap = cap
+        self._probe = probe
+
+    def read(self):
+        ret, frame = self._cap.read()
+        if ret:
+            self._probe.on_source(frame)
+        return ret, frame
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+class LatencyProbe:
+    def __init__(self, pulses=20, warmup=60, every=PULSE_EVERY, length=PULSE_FRAMES):
+        self.pulses = pulses
+        self.warmup = warmup  # frames before the first pulse (model loading, window setup)
+        self.every = every
+        self.length = length
+        self.source_times = []  # perf_counter() when the source produced each pulse
+        self.delivered = {}  # pulse -> (frame id, perf_counter()) when the game read it
+        self.displayed = {}  # pulse -> (start, end) of the display call that showed it
+        self._source_frames = 0
+        self._frames = 0
+        self._baseline = None
+        self._lit = False
+
+    def wrap_source(self, cap):
+        return _PulseSource(cap, self)
+
+    def on_source(self, frame):
+        n = self._source_frames - self.warmup
+        lit = n >= 0 and n % self.every < self.length
+        if n >= 0 and n % self.every == 0:
+            self.source_times.append(time.perf_counter())
+        paint_border(frame, 255 if lit else 0)
+        self._source_frames += 1
+
+    def on_frame(self, frame):
+        # Frame hook: counts frames the same way capture numbers them.
+        self._frames += 1
+        pulse = len(self.source_times) - 1
+        if pulse >= 0 and pulse not in self.delivered and border_level(frame) > 128:
+            self.delivered[pulse] = (self._frames, time.perf_counter())
+        if self._source_frames >= self.warmup + self.pulses * self.every:
+            raise SoakComplete()
+
+    def on_display(self, level, start, end):
+        if self._baseline is None:
+            self._baseline = level
+        lit = level > self._baseline + ON_DELTA
+        if lit and not self._lit:
+            pulse = len(self.source_times) - 1
+            if pulse >= 0 and pulse not in self.displayed:
+                self.displayed[pulse] = (start, end)
+        elif not lit:
+            self._baseline += 0.1 * (level - self._baseline)
+        self._lit = lit
+
+    def results(self, events):
+        # Splits each pulse's latency into stages using the trace spans of the
+        # frame that carried it.
+        spans = {}
+        for event in events:
+            frame = event.get("args", {}).get("frame")
+            if event.get("ph") == "X" and frame is not None:
+                spans.setdefault(frame, []).append(event)
+        latencies = []
+        stages = {stage: [] for stage in STAGES}
+        for pulse, (start, end) in sorted(self.displayed.items()):
+            source = self.source_times[pulse]
+            latencies.append((end - source) * 1000.0)
+            if pulse not in self.delivered:
+                continue
+            frame_spans = spans.get(self.delivered[pulse][0], [])
+            read_end = max(((e["ts"] + e["dur"]) / 1e6 for e in frame_spans if e["name"] == "cap.read"), default=None)
+            infer_end = max(((e["ts"] + e["dur"]) / 1e6 for e in frame_spans if e["name"] in INFERENCE_SPANS),
+                            default=None)
+            if read_end is None:
+                continue
+            stages["capture"].append((read_end - source) * 1000.0)
+            if infer_end is not None:
+                stages["inference"].append((infer_end - read_end) * 1000.0)
+            stages["update_draw"].append((start - (infer_end or read_end)) * 1000.0)
+            stages["present"].append((end - start) * 1000.0)
+        return {
+            "pulses": len(self.source_times),
+            "missed": len(self.source_times) - len(self.displayed),
+            "latencies_ms": [round(v, 3) for v in latencies],
+            "stages_ms": {stage: [round(v, 3) for v in values] for stage, values in stages.items()},
+        }
+
+
+def _install_display_hooks(probe):
+    # Hooks the two ways the games put a frame on screen (after
+    # install_headless(), if used, so the probe wraps its no-op imshow).
+    imshow = cv2.imshow
+
+    def probed_imshow(name, image):
+        level = border_level(image)
+        start = time.perf_counter()
+        imshow(name, image)
+        probe.on_display(level, start, time.perf_counter())
+
+    cv2.imshow = probed_imshow
+
+    try:
+        import pygame
+    except ImportError:
+        return
+    flip = pygame.display.flip
+
+    def probed_flip():
+        surface = pygame.display.get_surface()
+        pixels = pygame.surfarray.pixels3d(surface)
+        level = border_level(pixels)
+        del pixels  # unlocks the surface
+        start = time.perf_counter()
+        flip()
+        probe.on_display(level, start, time.perf_counter())
+
+    pygame.display.flip = probed_flip
+
+
+def make_fixture(path, seconds=20, fps=30, size=(640, 480)):
+    # A moving gradient with some noise: enough texture for the trackers to
+    # work on, no hands or bodies, so detection runs on every frame.
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    w, h = size
+    x = np.arange(w, dtype=np.float32)[None, :]
+    y = np.arange(h, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    for i in range(seconds * fps):
+        base = 128 + 100 * np.sin((x + 4 * i) / 60.0) * np.cos((y - 3 * i) / 80.0)
+        frame = np.clip(base[:, :, None] + rng.normal(0, 8, (h, w, 3)), 0, 255).astype(np.uint8)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def run_child(args):
+    os.environ["AR_SOURCE"] = os.path.abspath(args.source)
+    os.environ["AR_REPLAY_SPEED"] = "1"
+    os.environ["AR_REPLAY_LOOP"] = "1"
+    if args.headless:
+        install_headless()
+    out_path = os.path.abspath(args.out)
+    trace_path = os.path.abspath(args.trace or os.path.join(tempfile.gettempdir(), "latency-trace.json"))
+
+    probe = LatencyProbe(pulses=args.pulses, warmup=args.warmup)
+    capture.add_source_wrapper(probe.wrap_source)
+    _install_display_hooks(probe)
+    trace.start(trace_path)
+    completed = run_game(args.child, probe)
+    result = probe.results(trace.events())
+    trace.stop()
+    result["completed"] = completed
+
+    with open(out_path, "w") as f:
+        json.dump(result, f)
+    sys.stdout.flush()
+    os._exit(0)  # some games leave windows and threads behind
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "min": round(values[0], 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def parse_config(text):
+    # "name:ENV=VALUE,ENV=VALUE"
+    name, _, assignments = text.partition(":")
+    env = {}
+    for item in filter(None, assignments.split(",")):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError("expected ENV=VALUE in --config, got " + item)
+        env[key] = value
+    return name, env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure motion-to-photon latency of the games.")
+    parser.add_argument("scripts", nargs="*", help="game scripts, e.g. hand-gesture-ping-pong/main.py")
+    parser.add_argument("--source", help="video clip to replay (default: generated)")
+    parser.add_argument("--config", action="append", type=parse_config, default=[],
+                        help="pipeline configuration as name:ENV=VALUE,..., e.g. threaded:AR_CAPTURE_THREADED=1")
+    parser.add_argument("--pulses", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=60, help="frames before the first pulse")
+    parser.add_argument("--headless", action="store_true", help="run without windows")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds per game and configuration")
+    parser.add_argument("--report", default="latency_report.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args)
+    if not args.scripts:
+        parser.error("no game scripts given")
+
+    report_path = os.path.abspath(args.report)
+    report_stem = os.path.splitext(report_path)[0]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="latency-")
+    source = os.path.abspath(args.source) if args.source else make_fixture(os.path.join(workdir, "fixture.avi"))
+    configs = [("default", {})] + args.config
+
+    runs = []
+    for script in args.scripts:
+        game = os.path.relpath(os.path.abspath(script), root).replace(os.sep, "/")
+        for name, env in configs:
+            out = os.path.join(workdir, "result.json")
+            trace_path = "{}-{}-{}.trace.json".format(report_stem, game.replace("/", "-")[:-3], name)
+            command = [sys.executable, "-m", "common.latency", "--child", os.path.abspath(script),
+                       "--source", source, "--out", out, "--trace", trace_path,
+                       "--pulses", str(args.pulses), "--warmup", str(args.warmup)]
+            if args.headless:
+                command.append("--headless")
+            run = {"script": game, "config": name, "env": env, "trace": trace_path}
+            print("Measuring {} [{}]...".format(game, name))
+            try:
+                subprocess.run(command, cwd=root, env=dict(os.environ, **env), timeout=args.timeout)
+                with open(out) as f:
+                    run.update(json.load(f))
+                os.remove(out)
+            except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+                run["error"] = str(e)
+            run["latency_ms"] = summarize(run.get("latencies_ms", []))
+            run["stage_p50_ms"] = {stage: (summarize(values) or {}).get("p50")
+                                   for stage, values in run.get("stages_ms", {}).items()}
+            runs.append(run)
+
+    with open(report_path, "w") as f:
+        json.dump({"source": source, "runs": runs}, f, indent=2)
+
+    print()
+    print("{:<36} {:<10} {:>7} {:>7} {:>7} {:>7} {:>7}  {:>6}  stage p50 ms".format(
+        "game", "config", "p50", "p95", "p99", "min", "max", "missed"))
+    for run in runs:
+        latency = run["latency_ms"]
+        if latency is None:
+            print("{:<36} {:<10} {}".format(run["script"], run["config"], run.get("error", "no pulses reached the screen")))
+            continue
+        stages = " ".join("{}={}".format(stage, value) for stage, value in run["stage_p50_ms"].items()
+                          if value is not None)
+        print("{:<36} {:<10} {:>7} {:>7} {:>7} {:>7} {:>7}  {:>3}/{:<3} {}".format(
+            run["script"], run["config"], latency["p50"], latency["p95"], latency["p99"],
+            latency["min"], latency["max"], run["missed"], run["pulses"], stages))
+    print("Report written to " + report_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
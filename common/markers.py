@@ -0,0 +1,69 @@
+# Colour-marker tracking for stations that can't run MediaPipe.
+#
+# Players hold coloured paddles or wear coloured gloves. Each frame is
+# downsampled, thresholded in HSV and split into left/right halves; the
+# largest blob in each half is the player's marker. Returns the same
+# {"Left": (x, y) or None, "Right": ...} dict as detect_hand_position() in
+# hand-gesture-ping-pong/main.py (positions in the frame's pixel coordinates),
+# so games can swap backends. Runs in about a millisecond per frame on a
+# laptop CPU.
+import os
+
+import cv2
+import numpy as np
+
+# HSV ranges per marker colour (OpenCV hue is 0-179; red wraps around 0).
+COLOR_RANGES = {
+    "green": [((40, 70, 70), (85, 255, 255))],
+    "blue": [((95, 120, 70), (130, 255, 255))],
+    "yellow": [((20, 100, 100), (35, 255, 255))],
+    "red": [((0, 120, 70), (10, 255, 255)), ((170, 120, 70), (179, 255, 255))],
+}
+
+
+class ColorMarkerTracker:
+    def __init__(self, color="green", scale=4, min_area=20):
+        # scale: downsampling factor before thresholding
+        # min_area: smallest blob (in downsampled pixels) accepted as a marker
+        self.scale = scale
+        self.min_area = min_area
+        self.ranges = [(np.array(lo, np.uint8), np.array(hi, np.uint8)) for lo, hi in COLOR_RANGES[color]]
+        self._kernel = np.ones((3, 3), np.uint8)
+
+    def mask(self, frame):
+        # Binary mask of marker-coloured pixels in the downsampled BGR frame.
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (w // self.scale, h // self.scale), interpolation=cv2.INTER_NEAREST)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, *self.ranges[0])
+        for lo, hi in self.ranges[1:]:
+            mask |= cv2.inRange(hsv, lo, hi)
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+
+    def _largest_blob(self, mask):
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count < 2:
+            return None
+        areas = stats[1:, cv2.CC_STAT_AREA]  # label 0 is the background
+        best = int(np.argmax(areas))
+        if areas[best] < self.min_area:
+            return None
+        return centroids[best + 1]
+
+    def detect(self, frame):
+        # frame: BGR image (already mirrored like the games do).
+        mask = self.mask(frame)
+        mh, mw = mask.shape
+        half = mw // 2
+        positions = {"Left": None, "Right": None}
+        for label, x0, x1 in (("Left", 0, half), ("Right", half, mw)):
+            centroid = self._largest_blob(mask[:, x0:x1])
+            if centroid is not None:
+                cx, cy = centroid
+                positions[label] = (int((x0 + cx) * self.scale), int(cy * self.scale))
+        return positions
+
+
+def from_env():
+    # AR_MARKER_COLOR picks the marker colour (default green).
+    return ColorMarkerTracker(color=os.environ.get("AR_MARKER_COLOR", "green"))
@@ -0,0 +1,242 @@
+# Live metrics for fleet monitoring, in Prometheus text format.
+#
+# AR_METRICS_PORT=9100 serves them on http://127.0.0.1:9100/metrics
+# (AR_METRICS_ADDR changes the bind address), and AR_METRICS_FILE=path.prom
+# rewrites a file every AR_METRICS_INTERVAL seconds (default 5), which the
+# node_exporter textfile collector can pick up.
+#
+# Each metric has a single writer (the game loop, or the audio thread for the
+# audio ones). Updates are plain integer/float stores with no locks, so
+# recording costs the frame almost nothing; the exporter thread may read a
+# value that is one update behind, which is fine for monitoring.
+import atexit
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Bucket bounds in seconds.
+FRAME_BUCKETS = (0.008, 0.016, 0.025, 0.033, 0.05, 0.066, 0.1, 0.2, 0.5, 1.0)
+INFERENCE_BUCKETS = (0.002, 0.005, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075, 0.1, 0.25)
+LATENCY_BUCKETS = (0.01, 0.02, 0.033, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0)
+AUDIO_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+
+class Counter:
+    def __init__(self, name, help, labels=""):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        return ["{}{} {}".format(self.name, self.labels, self.value)]
+
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self):
+        counts = list(self.counts)
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append('{}_bucket{{le="{}"}} {}'.format(self.name, le, total))
+        lines.append("{}_sum {}".format(self.name, self.sum))
+        lines.append("{}_count {}".format(self.name, total))
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+frames = Counter("ar_frames_total", "Camera frames processed.")
+fps = Gauge("ar_fps", "Frames per second, smoothed.")
+frame_seconds = Histogram("ar_frame_seconds", "Time between consecutive camera frames.", FRAME_BUCKETS)
+inference_seconds = Histogram("ar_inference_seconds", "Hand/pose model inference time.", INFERENCE_BUCKETS)
+capture_to_display_seconds = Histogram("ar_capture_to_display_seconds",
+                                       "Time from camera read to frame shown on screen.", LATENCY_BUCKETS)
+capture_failures = Counter("ar_capture_failures_total", "cap.read() calls that returned no frame.")
+dropped_frames = Counter("ar_dropped_frames_total", "Camera frames skipped because the loop was too slow.")
+missed_deadlines = Counter("ar_missed_deadlines_total", "Frames whose work overran the frame interval.")
+stale_frames = Counter("ar_stale_frames_total", "Frames identical to the previous one (frozen camera).")
+detections_found = Counter("ar_detections_total", "Frames where a hand/pose was or wasn't detected.",
+                           '{result="found"}')
+detections_missing = Counter("ar_detections_total", "", '{result="missing"}')
+audio_start_delay_seconds = Histogram("ar_audio_start_delay_seconds",
+                                      "Time from a sound being triggered to the mixer starting it.", AUDIO_BUCKETS)
+audio_buffer_seconds = Gauge("ar_audio_buffer_seconds",
+                             "Mixer buffer requested from SDL (estimate of the output latency, not measured).")
+audio_dropped = Counter("ar_audio_dropped_total", "Sound triggers dropped (no free voice or retriggered too soon).")
+
+_metrics = [frames, fps, frame_seconds, inference_seconds, capture_to_display_seconds,
+            capture_failures, dropped_frames, missed_deadlines, stale_frames,
+            detections_found, detections_missing, audio_start_delay_seconds, audio_buffer_seconds, audio_dropped]
+
+_game_state = None
+_known_states = []
+_last_capture = None
+_last_sample = None
+
+
+def on_capture(frame, frame_period=None):
+    # Called by the shared capture after every successful read.
+    global _last_capture, _last_sample
+    now = time.perf_counter()
+    frames.inc()
+    if _last_capture is not None:
+        interval = now - _last_capture
+        frame_seconds.observe(interval)
+        fps.set(round(1.0 / interval, 2) if fps.value == 0 else
+                round(0.9 * fps.value + 0.1 / max(interval, 1e-6), 2))
+        if frame_period:
+            missed = int(interval / frame_period + 0.5) - 1
+            if missed > 0:
+                dropped_frames.inc(missed)
+    _last_capture = now
+
+    # A sparse pixel sample is enough to tell a frozen camera from a live one.
+    sample = frame[::16, ::16].tobytes()
+    if sample == _last_sample:
+        stale_frames.inc()
+    _last_sample = sample
+
+
+def on_display():
+    # Called right after the frame has been handed to the screen.
+    if _last_capture is not None:
+        capture_to_display_seconds.observe(time.perf_counter() - _last_capture)
+
+
+def record_detection(found):
+    if found:
+        detections_found.inc()
+    else:
+        detections_missing.inc()
+
+
+def set_state(state):
+    global _game_state
+    if state not in _known_states:
+        _known_states.append(state)
+    _game_state = state
+
+
+def render():
+    lines = ["# TYPE ar_info gauge",
+             'ar_info{{script="{}"}} 1'.format(os.path.basename(sys.argv[0]))]
+    seen = set()
+    for metric in _metrics:
+        if metric.name not in seen:
+            seen.add(metric.name)
+            kind = type(metric).__name__.lower()
+            lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.append("# TYPE {} {}".format(metric.name, kind))
+        lines.extend(metric.render())
+    if _known_states:
+        lines.append("# HELP ar_game_state Current game state (1 for the active one).")
+        lines.append("# TYPE ar_game_state gauge")
+        for state in list(_known_states):
+            lines.append('ar_game_state{{state="{}"}} {}'.format(state, int(state == _game_state)))
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the game's console
+
+
+def start_http_server(port, addr="127.0.0.1"):
+    # Returns None if the port can't be bound (e.g. another game already
+    # serves it); the game keeps running without the endpoint.
+    try:
+        server = HTTPServer((addr, port), _Handler)
+    except OSError as e:
+        print("Metrics endpoint disabled, cannot listen on {}:{}: {}".format(addr, port, e), file=sys.stderr)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_file(path):
+    # Write to a temp file and rename, so readers never see a half-written file.
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def _try_write_file(path, failed=False):
+    # Reports only the first of a run of failures (full disk, missing folder)
+    # so the console isn't flooded; returns whether this write failed.
+    try:
+        write_file(path)
+    except Exception as e:  # a failed write must not end the writer thread
+        if not failed:
+            print("Cannot write metrics to {}: {}".format(path, e), file=sys.stderr)
+        return True
+    return False
+
+
+def start_file_writer(path, interval=5.0):
+    def loop():
+        failed = False
+        while True:
+            failed = _try_write_file(path, failed)
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+    atexit.register(_try_write_file, path)
+
+
+if os.environ.get("AR_METRICS_PORT"):
+    start_http_server(int(os.environ["AR_METRICS_PORT"]), os.environ.get("AR_METRICS_ADDR", "127.0.0.1"))
+if os.environ.get("AR_METRICS_FILE"):
+    start_file_writer(os.environ["AR_METRICS_FILE"], float(os.environ.get("AR_METRICS_INTERVAL", "5")))
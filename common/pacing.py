@@ -0,0 +1,100 @@
+# Frame pacing for the game loops.
+#
+# Instead of spinning through cv2.waitKey(1) as fast as possible, a game ends
+# each frame with pacer.wait() (or pacer.wait_key() for OpenCV windows),
+# which sleeps until just before the camera's next frame is due. The sleep is
+# a coarse time.sleep() that learns how much the OS oversleeps, finished by a
+# short yield loop, so it stays accurate on Windows' ~15 ms timer as well.
+# A frame is never held past the camera's next frame, so pacing can't make
+# frames stale; AR_TARGET_FPS only applies when the source has no rate of its
+# own (e.g. a clip replayed unthrottled).
+#
+# Frames whose work overran the frame interval count as missed deadlines
+# (ar_missed_deadlines_total). Failed camera reads back off exponentially
+# instead of retrying in a tight loop.
+import os
+import time
+
+import cv2
+
+from common import capture, metrics, trace
+
+LEAD = 0.002  # wake up this long before the next camera frame is due
+MIN_BACKOFF, MAX_BACKOFF = 0.005, 0.5
+
+class FramePacer:
+    def __init__(self, cap, target_fps=None):
+        if target_fps is None:
+            target_fps = float(os.environ.get("AR_TARGET_FPS", "30"))
+        self.period = getattr(cap, "frame_period", None)
+        # A camera blocks in read() until its frame is ready, so wake up a
+        # little early; a free-running source is paced by the sleep alone.
+        self.lead = LEAD if self.period else 0.0
+        if not self.period:
+            self.period = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.missed = 0
+        self._arrival = self._wake = time.perf_counter()
+        self._oversleep = 0.0
+        self._backoff = 0.0
+        capture.add_frame_hook(self._on_frame)
+
+    def _on_frame(self, frame):
+        self._arrival = time.perf_counter()
+        self._backoff = 0.0
+
+    def _sleep_until(self, deadline):
+        with trace.span("pacer.sleep"):
+            remaining = deadline - time.perf_counter()
+            if remaining - self._oversleep > 0.001:
+                start = time.perf_counter()
+                time.sleep(remaining - self._oversleep)
+                overshoot = time.perf_counter() - start - (remaining - self._oversleep)
+                self._oversleep = max(0.0, 0.9 * self._oversleep + 0.1 * overshoot)
+            while time.perf_counter() < deadline:
+                time.sleep(0)
+
+    def _deadline(self):
+        # Returns when to start the next read, or None if the frame overran.
+        if self.period <= 0:
+            return None
+        now = time.perf_counter()
+        if self.lead:
+            # Camera: the next frame is due one period after this one arrived.
+            start = self._arrival
+        else:
+            # Free-running: keep a steady schedule from the last wake-up.
+            start = self._wake
+        deadline = start + self.period - self.lead
+        if now > start + self.period:
+            self.missed += 1
+            metrics.missed_deadlines.inc()
+            self._wake = now
+            return None
+        self._wake = deadline
+        return deadline
+
+    def wait(self):
+        deadline = self._deadline()
+        if deadline is not None:
+            self._sleep_until(deadline)
+
+    def wait_key(self):
+        # Like cv2.waitKey(1), but spends the rest of the frame budget inside
+        # waitKey so the window stays responsive while the loop sleeps.
+        deadline = self._deadline()
+        if deadline is None:
+            return cv2.waitKey(1)
+        remaining_ms = int((deadline - time.perf_counter() - self._oversleep) * 1000)
+        key = cv2.waitKey(max(1, remaining_ms))
+        if key == -1:
+            self._sleep_until(deadline)
+        return key
+
+    def capture_failed(self):
+        # Call when cap.read() fails and the loop is going to retry.
+        self._backoff = min(MAX_BACKOFF, max(MIN_BACKOFF, self._backoff * 2))
+        with trace.span("pacer.backoff", seconds=self._backoff):
+            time.sleep(self._backoff)
+
+    def close(self):
+        capture.remove_frame_hook(self._on_frame)
@@ -0,0 +1,84 @@
+# Multi-person pose tracking by fixed player zones.
+#
+# MediaPipe Pose follows a single person, so for party mode the frame is
+# split into side-by-side zones, one per player, and each zone gets its own
+# Pose instance. Every zone crop is letterboxed to the model's fixed input,
+# so a crop costs as much as a full frame: N zones cost N pose passes, and
+# batching them through the interpreter doesn't help either (XNNPACK runs a
+# batch of N in N times the time).
+#
+# To keep frame time from growing with the player count, at most
+# `max_passes` zones are processed per frame, in turn; the other players
+# keep their last position until their zone comes round again. A pose pass
+# keeps about one core busy, so the default budget is one pass per CPU core
+# (AR_POSE_BUDGET overrides it), and the passes of one frame run on a thread
+# pool only when there is more than one core. On a single core every player
+# count costs one pass per frame: 2 players measured 0.8-1.15x the frame time
+# of one player, and 3 or 4 players 0.6-1.15x, with each of N players updated
+# every Nth frame. With N or more cores all players update every frame.
+#   python -m common.benchmark_trackers clip.mp4 --task pose --players 1 2 3 4
+# measures frame time against player count.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common import metrics, trace
+
+
+def split_zones(width, count):
+    # [(x0, x1), ...] of `count` equal vertical strips covering `width`.
+    edges = [width * i // count for i in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class ZonePoseTracker:
+    def __init__(self, num_players, make_pose, landmark, max_passes=None):
+        # make_pose: factory for one pose model, e.g. mp.solutions.pose.Pose
+        # landmark: index of the landmark to report, e.g. PoseLandmark.NOSE
+        # max_passes: zones processed per frame (default: AR_POSE_BUDGET, or
+        # the number of CPU cores)
+        if max_passes is None:
+            max_passes = int(os.environ.get("AR_POSE_BUDGET", "0")) or os.cpu_count() or 1
+        self.num_players = num_players
+        self.landmark = landmark
+        self.max_passes = max(1, min(num_players, max_passes))
+        self._poses = [make_pose() for _ in range(num_players)]
+        self._points = [None] * num_players  # last position seen in each zone
+        self._next = 0  # first zone to process on the next frame
+        self._pool = ThreadPoolExecutor(max_workers=self.max_passes) if self.max_passes > 1 else None
+
+    def _process(self, player, rgb_frame, x0, x1, frame_id):
+        with trace.span("pose.process", frame=frame_id, player=player):
+            crop = np.ascontiguousarray(rgb_frame[:, x0:x1])
+            results = self._poses[player].process(crop)
+        if not results.pose_landmarks:
+            return None
+        point = results.pose_landmarks.landmark[self.landmark]
+        # Map back from crop to full-frame normalized coordinates.
+        width = rgb_frame.shape[1]
+        return ((x0 + point.x * (x1 - x0)) / width, point.y)
+
+    def process(self, rgb_frame, frame_id=None):
+        # Returns one (x, y) normalized landmark position per player, or None
+        # for players whose zone had nobody in it when it was last processed.
+        zones = split_zones(rgb_frame.shape[1], self.num_players)
+        players = [(self._next + i) % self.num_players for i in range(self.max_passes)]
+        self._next = (self._next + self.max_passes) % self.num_players
+        with metrics.inference_seconds.time():
+            if self._pool is None:
+                points = [self._process(p, rgb_frame, zones[p][0], zones[p][1], frame_id) for p in players]
+            else:
+                futures = [self._pool.submit(self._process, p, rgb_frame, zones[p][0], zones[p][1], frame_id)
+                           for p in players]
+                points = [future.result() for future in futures]
+        for player, point in zip(players, points):
+            self._points[player] = point
+            metrics.record_detection(point is not None)
+        return list(self._points)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+        for pose in self._poses:
+            pose.close()
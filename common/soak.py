@@ -0,0 +1,279 @@
+# Long-run soak mode.
+#
+# Drives a game from a looping replay clip for hours and samples memory,
+# open handles, GC activity and frame time at fixed intervals. At the end it
+# fits a trend line to the samples and fails if memory or latency keep
+# climbing, which is what a leak looks like on a station that runs all day.
+#
+# Run from the repository root:
+#   python -m common.soak hand-gesture-ping-pong/tejas.py --source clip.mp4 --hours 12
+# Add --headless on a machine without a display.
+import argparse
+import gc
+import json
+import os
+import runpy
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+import cv2
+
+from common import capture
+
+
+# Growth below these over a whole run is treated as noise.
+RSS_NOISE_MB = 16.0
+LATENCY_NOISE_MS = 1.0
+
+
+class SoakComplete(Exception):
+    # Raised from the frame hook to stop the game once the soak time is up.
+    pass
+
+
+def current_rss():
+    # Resident set size in bytes, or None if the platform gives no way to read it.
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def open_handles():
+    try:
+        import psutil
+        process = psutil.Process()
+        if hasattr(process, "num_handles"):
+            return process.num_handles()
+        return process.num_fds()
+    except ImportError:
+        pass
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def slope_per_hour(points):
+    # Least-squares slope of (seconds, value) points, in value units per hour.
+    points = [(t, v) for t, v in points if v is not None]
+    if len(points) < 3:
+        return 0.0
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t == 0:
+        return 0.0
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var_t * 3600.0
+
+
+class SoakMonitor:
+    def __init__(self, duration, interval=60.0, warmup=0.1, trace_allocations=True, top_allocators=5):
+        self.duration = duration
+        self.interval = interval
+        self.warmup = warmup
+        self.trace_allocations = trace_allocations
+        self.top_allocators = top_allocators
+        self.samples = []
+        self.frames = 0
+        self._frame_times = deque(maxlen=10000)
+        self._start = None
+        self._last_frame = None
+        self._next_sample = None
+        self._baseline = None
+
+    def start(self):
+        if self.trace_allocations:
+            tracemalloc.start()
+            self._baseline = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+        self._last_frame = self._start
+        self._next_sample = self._start + self.interval
+
+    def on_frame(self, frame=None):
+        now = time.perf_counter()
+        if self._start is None:
+            self.start()
+            return
+        self._frame_times.append(now - self._last_frame)
+        self._last_frame = now
+        self.frames += 1
+
+        if now - self._start >= self.duration:
+            self.sample(now)
+            raise SoakComplete()
+        if now >= self._next_sample:
+            self.sample(now)
+            self._next_sample = now + self.interval
+            # Don't count the time spent sampling as frame time.
+            self._last_frame = time.perf_counter()
+
+    def sample(self, now=None):
+        now = time.perf_counter() if now is None else now
+        frame_times = sorted(self._frame_times)
+        self._frame_times.clear()
+        sample = {
+            "elapsed_s": round(now - self._start, 3),
+            "frames": self.frames,
+            "rss_mb": None,
+            "open_handles": open_handles(),
+            "gc_counts": list(gc.get_count()),
+            "gc_collections": [s["collections"] for s in gc.get_stats()],
+            "frame_ms_p50": None,
+            "frame_ms_p95": None,
+            "frame_ms_p99": None,
+            "top_allocators": [],
+        }
+        rss = current_rss()
+        if rss is not None:
+            sample["rss_mb"] = round(rss / 2 ** 20, 2)
+        for pct in (50, 95, 99):
+            value = percentile(frame_times, pct)
+            if value is not None:
+                sample["frame_ms_p{}".format(pct)] = round(value * 1000.0, 3)
+        if self._baseline is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for stat in snapshot.compare_to(self._baseline, "lineno")[:self.top_allocators]:
+                frame = stat.traceback[0]
+                sample["top_allocators"].append({
+                    "where": "{}:{}".format(frame.filename, frame.lineno),
+                    "size_diff_kb": round(stat.size_diff / 1024.0, 1),
+                    "count_diff": stat.count_diff,
+                })
+        self.samples.append(sample)
+        return sample
+
+    def evaluate(self, max_rss_slope_mb=8.0, max_latency_slope_ms=2.0, max_handle_growth=8):
+        # Ignore the warm-up part of the run (caches filling, model loading).
+        if self.samples:
+            cutoff = self.samples[-1]["elapsed_s"] * self.warmup
+        else:
+            cutoff = 0
+        steady = [s for s in self.samples if s["elapsed_s"] >= cutoff]
+        rss_slope = slope_per_hour([(s["elapsed_s"], s["rss_mb"]) for s in steady])
+        latency_slope = slope_per_hour([(s["elapsed_s"], s["frame_ms_p95"]) for s in steady])
+        handles = [s["open_handles"] for s in steady if s["open_handles"] is not None]
+        handle_growth = handles[-1] - handles[0] if len(handles) >= 2 else 0
+
+        # A steep slope over a short run is usually noise; only fail when the
+        # fitted growth across the run is also above a small floor.
+        span_h = (steady[-1]["elapsed_s"] - steady[0]["elapsed_s"]) / 3600.0 if steady else 0.0
+        failures = []
+        if rss_slope > max_rss_slope_mb and rss_slope * span_h > RSS_NOISE_MB:
+            failures.append("RSS grows {:.2f} MB/h (limit {})".format(rss_slope, max_rss_slope_mb))
+        if latency_slope > max_latency_slope_ms and latency_slope * span_h > LATENCY_NOISE_MS:
+            failures.append("p95 frame time grows {:.2f} ms/h (limit {})".format(latency_slope, max_latency_slope_ms))
+        if handle_growth > max_handle_growth:
+            failures.append("open handles grew by {} (limit {})".format(handle_growth, max_handle_growth))
+        return {
+            "passed": not failures,
+            "failures": failures,
+            "rss_slope_mb_per_h": round(rss_slope, 3),
+            "p95_frame_ms_slope_per_h": round(latency_slope, 3),
+            "handle_growth": handle_growth,
+            "frames": self.frames,
+            "samples": self.samples,
+        }
+
+
+def install_headless():
+    # Lets a game run without a display: OpenCV windows become no-ops,
+    # pygame draws to SDL's dummy video driver and sounds are discarded.
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("AR_AUDIO_SINK", "null")
+    cv2.imshow = lambda name, image: None
+    cv2.namedWindow = lambda *args, **kwargs: None
+    cv2.destroyAllWindows = lambda: None
+    # Keep the wait so frame pacing behaves as it would with a window.
+    cv2.waitKey = lambda delay=0: time.sleep(delay / 1000.0) or -1
+
+
+def run_game(script, monitor):
+    # Runs a game script in this process so tracemalloc and gc see its objects.
+    script = os.path.abspath(script)
+    game_dir = os.path.dirname(script)
+    old_cwd, old_argv = os.getcwd(), sys.argv
+    os.chdir(game_dir)  # games load their assets relative to their folder
+    sys.path.insert(0, game_dir)
+    sys.argv = [script]
+    capture.add_frame_hook(monitor.on_frame)
+    completed = False
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SoakComplete:
+        completed = True
+    finally:
+        capture.remove_frame_hook(monitor.on_frame)
+        sys.argv = old_argv
+        sys.path.remove(game_dir)
+        os.chdir(old_cwd)
+    return completed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a game from a replay clip and check for leaks.")
+    parser.add_argument("script", help="game script, e.g. hand-gesture-ping-pong/tejas.py")
+    parser.add_argument("--source", required=True, help="video file to replay in a loop")
+    parser.add_argument("--hours", type=float, default=12.0)
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between samples")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--report", default="soak_report.json")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip allocation tracking (lower overhead)")
+    parser.add_argument("--headless", action="store_true", help="run without windows")
+    parser.add_argument("--max-rss-slope", type=float, default=8.0, help="MB per hour")
+    parser.add_argument("--max-latency-slope", type=float, default=2.0, help="p95 ms per hour")
+    parser.add_argument("--max-handle-growth", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    os.environ["AR_SOURCE"] = os.path.abspath(args.source)
+    os.environ["AR_REPLAY_SPEED"] = str(args.speed)
+    os.environ["AR_REPLAY_LOOP"] = "1"
+    os.environ.setdefault("AR_TARGET_FPS", "0")  # don't let frame pacing undo the speed-up
+    if args.headless:
+        install_headless()
+    report_path = os.path.abspath(args.report)
+
+    monitor = SoakMonitor(args.hours * 3600.0, interval=args.interval,
+                          trace_allocations=not args.no_tracemalloc)
+    completed = run_game(args.script, monitor)
+    result = monitor.evaluate(args.max_rss_slope, args.max_latency_slope, args.max_handle_growth)
+    result["script"] = args.script
+    result["completed"] = completed
+    if not completed:
+        result["passed"] = False
+        result["failures"].append("game exited before the soak time was up")
+
+    with open(report_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print("Soak {}: {} frames, RSS {:+.2f} MB/h, p95 frame time {:+.2f} ms/h".format(
+        "PASSED" if result["passed"] else "FAILED", result["frames"],
+        result["rss_slope_mb_per_h"], result["p95_frame_ms_slope_per_h"]))
+    for failure in result["failures"]:
+        print("  - " + failure)
+    print("Report written to " + report_path)
+    return 0 if result["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
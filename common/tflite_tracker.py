@@ -0,0 +1,368 @@
+# Hand and pose tracking straight through the TFLite interpreter.
+#
+# Runs the same models as mp.solutions.hands.Hands / mp.solutions.pose.Pose,
+# but with explicit control over what the solutions graph hides:
+#  - the interpreter thread count (XNNPACK) and an optional external delegate,
+#  - the split between the detector and the landmark model: the detector only
+#    runs while a hand/person is missing, otherwise the landmarks of the last
+#    frame give the region to crop,
+#  - input tensors, which are written in place instead of reallocated.
+# process() returns a results object with the same fields the games read from
+# the solutions API (multi_hand_landmarks/multi_handedness, pose_landmarks),
+# plus the raw landmarks as numpy arrays, so the backends are interchangeable.
+# Landmark smoothing and the pose heatmap refinement are not reproduced, so
+# positions differ from the solutions API: on a 512x600 test image pose is
+# about 9 px off at the face and 35-40 px at the shoulders (13 px on average
+# over the visible landmarks). common.benchmark_trackers reports the
+# difference on your own clips.
+#
+# Needs a TFLite interpreter: ai-edge-litert, tflite-runtime or tensorflow.
+# The model files are taken from the installed mediapipe package unless
+# AR_TFLITE_MODELS points at a folder that holds them.
+import math
+import os
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+try:
+    from ai_edge_litert.interpreter import Interpreter, load_delegate
+except ImportError:
+    try:
+        from tflite_runtime.interpreter import Interpreter, load_delegate
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+        load_delegate = tf.lite.experimental.load_delegate
+
+try:
+    # Real landmark protobufs keep mp.solutions.drawing_utils working.
+    from mediapipe.framework.formats import classification_pb2, landmark_pb2
+except ImportError:
+    classification_pb2 = landmark_pb2 = None
+
+MODELS = {
+    "palm_detection": "palm_detection/palm_detection_full.tflite",
+    "hand_landmark": "hand_landmark/hand_landmark_full.tflite",
+    "pose_detection": "pose_detection/pose_detection.tflite",
+    "pose_landmark": "pose_landmark/pose_landmark_full.tflite",
+}
+
+
+def model_path(name):
+    folder = os.environ.get("AR_TFLITE_MODELS")
+    if folder:
+        return os.path.join(folder, os.path.basename(MODELS[name]))
+    import mediapipe
+    return os.path.join(os.path.dirname(mediapipe.__file__), "modules", MODELS[name])
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -50, 50)))
+
+
+def _probability(x):
+    # Some model versions emit the flag as a logit, others already squashed.
+    x = float(x)
+    return x if 0.0 <= x <= 1.0 else float(_sigmoid(x))
+
+
+def _normalize_radians(angle):
+    return angle - 2 * math.pi * math.floor((angle + math.pi) / (2 * math.pi))
+
+
+def ssd_anchors(input_size, strides):
+    # Anchor centres of MediaPipe's SSD detectors (fixed size, two anchors per
+    # cell per layer; consecutive layers with the same stride share a grid).
+    anchors = []
+    i = 0
+    while i < len(strides):
+        repeats = 1
+        while i + repeats < len(strides) and strides[i + repeats] == strides[i]:
+            repeats += 1
+        grid = int(math.ceil(input_size / float(strides[i])))
+        for y in range(grid):
+            for x in range(grid):
+                anchors.extend([((x + 0.5) / grid, (y + 0.5) / grid)] * (2 * repeats))
+        i += repeats
+    return np.array(anchors, np.float32)
+
+
+class _Model:
+    def __init__(self, name, num_threads=None, delegate=None):
+        delegates = [load_delegate(delegate)] if delegate else None
+        self.interpreter = Interpreter(model_path=model_path(name), num_threads=num_threads,
+                                       experimental_delegates=delegates)
+        self.interpreter.allocate_tensors()
+        details = self.interpreter.get_input_details()[0]
+        self.size = int(details["shape"][1])
+        self._input_index = details["index"]
+        self.outputs = sorted(self.interpreter.get_output_details(), key=lambda d: d["name"])
+
+    def run(self, image, low, high):
+        # image: size x size uint8 RGB. Written straight into the interpreter's
+        # input tensor, scaled to [low, high].
+        tensor = self.interpreter.tensor(self._input_index)()[0]
+        np.multiply(image, (high - low) / 255.0, out=tensor, casting="unsafe")
+        if low:
+            tensor += low
+        del tensor  # the interpreter refuses to run while a view is held
+        self.interpreter.invoke()
+        return [self.interpreter.get_tensor(d["index"]) for d in self.outputs]
+
+
+class Roi:
+    # Rotated square region of the frame, in pixels.
+
+    def __init__(self, cx, cy, size, rotation=0.0):
+        self.cx, self.cy, self.size, self.rotation = cx, cy, size, rotation
+
+    def matrix(self, out_size):
+        # 2x3 affine mapping crop pixels to frame pixels.
+        scale = self.size / float(out_size)
+        c, s = math.cos(self.rotation) * scale, math.sin(self.rotation) * scale
+        half = out_size / 2.0
+        return np.array([[c, -s, self.cx - c * half + s * half],
+                         [s, c, self.cy - s * half - c * half]], np.float32)
+
+    def crop(self, image, out_size, out=None):
+        return cv2.warpAffine(image, self.matrix(out_size), (out_size, out_size), dst=out,
+                              flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                              borderMode=cv2.BORDER_CONSTANT)
+
+    def to_frame(self, points, out_size):
+        # points: (n, 2+) in crop pixels -> same array with x, y in frame pixels.
+        m = self.matrix(out_size)
+        xy = points[:, :2] @ m[:, :2].T + m[:, 2]
+        result = points.copy()
+        result[:, :2] = xy
+        return result
+
+    def iou(self, other):
+        # Axis-aligned overlap, good enough to tell whether two ROIs are one hand.
+        ax0, ay0 = self.cx - self.size / 2, self.cy - self.size / 2
+        bx0, by0 = other.cx - other.size / 2, other.cy - other.size / 2
+        w = min(ax0 + self.size, bx0 + other.size) - max(ax0, bx0)
+        h = min(ay0 + self.size, by0 + other.size) - max(ay0, by0)
+        if w <= 0 or h <= 0:
+            return 0.0
+        inter = w * h
+        return inter / (self.size ** 2 + other.size ** 2 - inter)
+
+
+def _rotation(x0, y0, x1, y1):
+    # Angle that turns the (x0, y0) -> (x1, y1) direction to point up.
+    return _normalize_radians(math.pi / 2 - math.atan2(-(y1 - y0), x1 - x0))
+
+
+def _transform(roi, scale, shift_y=0.0, height=None):
+    # MediaPipe's RectTransformation: shift along the ROI's own y axis by a
+    # fraction of its height, then make it square and scale it.
+    height = roi.size if height is None else height
+    roi.cx -= height * shift_y * math.sin(roi.rotation)
+    roi.cy += height * shift_y * math.cos(roi.rotation)
+    roi.size *= scale
+    return roi
+
+
+class _Detector:
+    # SSD detector (palm or pose) run on the letterboxed full frame.
+
+    def __init__(self, name, strides, input_range, num_threads, delegate, min_score):
+        # input_range: (low, high) the model expects pixels scaled to, as set
+        # by ImageToTensorCalculator in its MediaPipe graph.
+        self.model = _Model(name, num_threads, delegate)
+        self.input_range = input_range
+        self.anchors = ssd_anchors(self.model.size, strides)
+        self.min_score = min_score
+        self._input = np.empty((self.model.size, self.model.size, 3), np.uint8)
+
+    def detect(self, rgb):
+        # Returns [(score, points, box size)] best first: points is (1 + k, 2)
+        # frame pixels, the box centre followed by the k keypoints.
+        h, w = rgb.shape[:2]
+        frame_roi = Roi(w / 2.0, h / 2.0, max(w, h))
+        size = self.model.size
+        frame_roi.crop(rgb, size, out=self._input)
+        outputs = self.model.run(self._input, *self.input_range)
+        raw_boxes = next(o for o in outputs if o.shape[-1] > 1)[0]
+        scores = _sigmoid(next(o for o in outputs if o.shape[-1] == 1)[0, :, 0])
+
+        detections = []
+        for i in np.argsort(-scores):
+            if scores[i] < self.min_score:
+                break
+            raw = raw_boxes[i]
+            keypoints = raw[4:].reshape(-1, 2) / size + self.anchors[i]
+            center = raw[:2] / size + self.anchors[i]
+            points = frame_roi.to_frame(np.vstack([center, keypoints]) * size, size)
+            box_size = max(raw[2], raw[3]) * frame_roi.size / size
+            # Skip boxes centred inside a better one (a cheap NMS).
+            if any(np.hypot(*(points[0] - d[1][0])) < box_size / 2 for d in detections):
+                continue
+            detections.append((float(scores[i]), points, box_size))
+        return detections
+
+
+def _landmark_list(points, width, height):
+    # points: (n, 3+) frame pixels (x, y, z[, visibility]) -> normalized list.
+    if landmark_pb2 is None:
+        return SimpleNamespace(landmark=[
+            SimpleNamespace(x=p[0] / width, y=p[1] / height, z=p[2] / width,
+                            visibility=p[3] if len(p) > 3 else 0.0)
+            for p in points])
+    result = landmark_pb2.NormalizedLandmarkList()
+    for p in points:
+        lm = result.landmark.add()
+        lm.x, lm.y, lm.z = p[0] / width, p[1] / height, p[2] / width
+        if len(p) > 3:
+            lm.visibility = p[3]
+    return result
+
+
+def _handedness(label, score):
+    if classification_pb2 is None:
+        return SimpleNamespace(classification=[SimpleNamespace(label=label, score=score, index=int(label == "Right"))])
+    result = classification_pb2.ClassificationList()
+    result.classification.add(label=label, score=score, index=int(label == "Right"))
+    return result
+
+
+# Landmarks HandLandmarksToRect uses for the next frame's crop.
+_HAND_RECT_LANDMARKS = [0, 1, 2, 3, 5, 6, 9, 10, 13, 14, 17, 18]
+
+
+class TFLiteHands:
+    # Drop-in for mp.solutions.hands.Hands (static_image_mode not supported).
+
+    def __init__(self, max_num_hands=2, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 num_threads=None, delegate=None):
+        num_threads = num_threads or int(os.environ.get("AR_TFLITE_THREADS", "0")) or None
+        delegate = delegate or os.environ.get("AR_TFLITE_DELEGATE") or None
+        self.max_num_hands = max_num_hands
+        self.min_tracking_confidence = min_tracking_confidence
+        self.palm = _Detector("palm_detection", [8, 16, 16, 16], (0.0, 1.0), num_threads, delegate,
+                              min_detection_confidence)
+        self.landmark = _Model("hand_landmark", num_threads, delegate)
+        self._input = np.empty((self.landmark.size, self.landmark.size, 3), np.uint8)
+        self._rois = []  # one per tracked hand
+        self.palm_runs = 0
+
+    def _detect(self, rgb):
+        self.palm_runs += 1
+        for _, points, box_size in self.palm.detect(rgb):
+            if len(self._rois) >= self.max_num_hands:
+                break
+            # Around the palm box, turned so wrist (kp 0) -> middle finger (kp 2) is up.
+            rotation = _rotation(points[1][0], points[1][1], points[3][0], points[3][1])
+            roi = _transform(Roi(points[0][0], points[0][1], box_size, rotation), 2.6, -0.5)
+            if all(roi.iou(other) < 0.5 for other in self._rois):
+                self._rois.append(roi)
+
+    def _next_roi(self, points):
+        x0, y0 = points[0, :2]
+        x1, y1 = (points[5, :2] + points[13, :2]) / 2.0
+        x1, y1 = (np.array([x1, y1]) + points[9, :2]) / 2.0
+        rotation = _rotation(x0, y0, x1, y1)
+        # Bounding box of the palm landmarks in the hand's own orientation.
+        c, s = math.cos(rotation), math.sin(rotation)
+        rel = points[_HAND_RECT_LANDMARKS, :2]
+        rotated = rel @ np.array([[c, -s], [s, c]])
+        lo, hi = rotated.min(axis=0), rotated.max(axis=0)
+        center = ((lo + hi) / 2.0) @ np.array([[c, s], [-s, c]])
+        roi = Roi(center[0], center[1], float(max(hi - lo)), rotation)
+        return _transform(roi, 2.0, -0.1, height=float(hi[1] - lo[1]))
+
+    def process(self, rgb):
+        h, w = rgb.shape[:2]
+        if len(self._rois) < self.max_num_hands:
+            self._detect(rgb)
+
+        hands, tracked = [], []
+        size = self.landmark.size
+        for roi in self._rois:
+            roi.crop(rgb, size, out=self._input)
+            outputs = self.landmark.run(self._input, 0.0, 1.0)
+            flags = [o for o in outputs if o.size == 1]
+            presence, handedness = _probability(flags[0]), _probability(flags[1])
+            if presence < self.min_tracking_confidence:
+                continue
+            landmarks = next(o for o in outputs if o.size == 63).reshape(21, 3)
+            points = roi.to_frame(landmarks, size)
+            points[:, 2] *= roi.size / size
+            hands.append((points, handedness))
+            tracked.append(self._next_roi(points))
+        self._rois = tracked
+
+        if not hands:
+            return SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None,
+                                   hand_landmarks=np.empty((0, 21, 3), np.float32))
+        normalized = np.stack([p for p, _ in hands]) / np.array([w, h, w], np.float32)
+        return SimpleNamespace(
+            multi_hand_landmarks=[_landmark_list(p, w, h) for p, _ in hands],
+            # The hand graph classifies with the label map "Left\nRight" and binary
+            # classification, so a raw score above 0.5 means "Left".
+            multi_handedness=[_handedness("Left" if s > 0.5 else "Right", max(s, 1 - s))
+                              for _, s in hands],
+            hand_landmarks=normalized.astype(np.float32))
+
+    def close(self):
+        pass
+
+
+class TFLitePose:
+    # Drop-in for mp.solutions.pose.Pose (landmarks only, no segmentation).
+
+    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 num_threads=None, delegate=None):
+        num_threads = num_threads or int(os.environ.get("AR_TFLITE_THREADS", "0")) or None
+        delegate = delegate or os.environ.get("AR_TFLITE_DELEGATE") or None
+        self.min_tracking_confidence = min_tracking_confidence
+        self.detector = _Detector("pose_detection", [8, 16, 32, 32, 32], (-1.0, 1.0), num_threads, delegate,
+                                  min_detection_confidence)
+        self.landmark = _Model("pose_landmark", num_threads, delegate)
+        self._input = np.empty((self.landmark.size, self.landmark.size, 3), np.uint8)
+        self._roi = None
+        self.detector_runs = 0
+
+    @staticmethod
+    def _roi_from(center, scale_point):
+        # Hip centre -> full-body scale point, as in the pose alignment graph.
+        (x0, y0), (x1, y1) = center, scale_point
+        size = 2.0 * math.hypot(x1 - x0, y1 - y0)
+        return _transform(Roi(x0, y0, size, _rotation(x0, y0, x1, y1)), 1.25)
+
+    def process(self, rgb):
+        h, w = rgb.shape[:2]
+        if self._roi is None:
+            self.detector_runs += 1
+            detections = self.detector.detect(rgb)
+            if detections:
+                points = detections[0][1]
+                self._roi = self._roi_from(points[1], points[2])
+
+        empty = SimpleNamespace(pose_landmarks=None, landmarks=np.empty((0, 4), np.float32))
+        if self._roi is None:
+            return empty
+        size = self.landmark.size
+        self._roi.crop(rgb, size, out=self._input)
+        outputs = self.landmark.run(self._input, 0.0, 1.0)
+        presence = _probability(next(o for o in outputs if o.size == 1))
+        if presence < self.min_tracking_confidence:
+            self._roi = None
+            return empty
+        raw = next(o for o in outputs if o.size == 195).reshape(39, 5)
+        points = self._roi.to_frame(raw[:, :4], size)
+        points[:, 2] *= self._roi.size / size
+        points[:, 3] = _sigmoid(raw[:, 3])
+        # Landmarks 33/34 are the alignment points for the next frame.
+        self._roi = self._roi_from(points[33, :2], points[34, :2])
+
+        body = points[:33]
+        normalized = body / np.array([w, h, w, 1.0], np.float32)
+        return SimpleNamespace(pose_landmarks=_landmark_list(body, w, h),
+                               landmarks=normalized.astype(np.float32))
+
+    def close(self):
+        pass
@@ -0,0 +1,180 @@
+# Lightweight per-frame tracing.
+#
+# Spans are written as Chrome trace events, so the output file opens in
+# Perfetto (ui.perfetto.dev) or chrome://tracing. Tracing is off by default
+# and span() then returns a shared no-op object, so leaving the calls in the
+# game loops costs next to nothing.
+#
+# Turn it on with AR_TRACE=path/to/trace.json (a "{pid}" in the path is
+# replaced by the process id), or press 'T' in a game to start/stop it.
+# Every span carries the id of the camera frame it belongs to, so stages that
+# run on other threads or in other processes line up on the same frame.
+# Files from several processes can be merged:
+#   python -m common.trace merge combined.json trace-*.json
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+DEFAULT_PATH = "trace-{pid}.json"
+# Spans kept in memory, oldest dropped first: about 25 MB, or 5 minutes of a
+# game at 30 fps and 10 spans per frame.
+MAX_EVENTS = 100000
+
+
+def _now_us():
+    return time.perf_counter_ns() / 1000.0
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "frame", "args", "start")
+
+    def __init__(self, tracer, name, frame, args):
+        self.tracer = tracer
+        self.name = name
+        self.frame = frame
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.start, _now_us() - self.start, self.frame, self.args)
+        return False
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.current_frame = None
+        # Spans are kept as compact (name, ts, dur, tid, frame, args) tuples and
+        # only turned into trace event dicts when saved.
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._metadata = []  # process and thread names
+        self._named_threads = set()
+        self._pid = os.getpid()
+
+    def start(self, path=None):
+        self.path = (path or self.path or DEFAULT_PATH).replace("{pid}", str(self._pid))
+        self._events.clear()
+        self._named_threads.clear()
+        self._metadata = [{"ph": "M", "name": "process_name", "pid": self._pid, "tid": 0,
+                           "args": {"name": os.path.basename(sys.argv[0]) or "python"}}]
+        self.enabled = True
+
+    def stop(self):
+        # Stops recording and writes the trace file; returns its path.
+        if not self.enabled:
+            return None
+        self.enabled = False
+        return self.save()
+
+    def toggle(self):
+        if self.enabled:
+            path = self.stop()
+            print("Trace written to " + path)
+        else:
+            self.start()
+            print("Tracing to " + self.path)
+
+    def span(self, name, frame=None, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, self.current_frame if frame is None else frame, args)
+
+    def complete(self, name, start_us, dur_us, frame=None, args=None):
+        # Records a finished span. Safe to call from any thread: list and
+        # deque appends are atomic, so the hot path takes no lock.
+        tid = threading.get_ident()
+        if tid not in self._named_threads:
+            self._named_threads.add(tid)
+            self._metadata.append({"ph": "M", "name": "thread_name", "pid": self._pid, "tid": tid,
+                                   "args": {"name": threading.current_thread().name}})
+        self._events.append((name, start_us, dur_us, tid, frame, args or None))
+
+    def events(self):
+        # The recorded spans as Chrome trace event dicts.
+        events = list(self._metadata)
+        for name, ts, dur, tid, frame, args in list(self._events):
+            event = {"ph": "X", "name": name, "ts": ts, "dur": dur,
+                     "pid": self._pid, "tid": tid, "args": dict(args) if args else {}}
+            if frame is not None:
+                event["args"]["frame"] = frame
+                # Flow arrows connect the spans of one frame across threads/processes.
+                event["bind_id"] = frame
+                event["flow_in"] = True
+                event["flow_out"] = True
+            events.append(event)
+        return events
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+        return path
+
+
+_tracer = Tracer()
+
+span = _tracer.span
+complete = _tracer.complete
+start = _tracer.start
+stop = _tracer.stop
+toggle = _tracer.toggle
+save = _tracer.save
+
+
+def is_enabled():
+    return _tracer.enabled
+
+
+def events():
+    # The recorded events, for tools that analyse a run in-process.
+    return _tracer.events()
+
+
+def set_frame(frame_id):
+    # Frame id used by spans that don't pass one explicitly.
+    _tracer.current_frame = frame_id
+
+
+def _save_at_exit():
+    if _tracer.enabled:
+        print("Trace written to " + _tracer.stop())
+
+
+atexit.register(_save_at_exit)
+
+if os.environ.get("AR_TRACE"):
+    start(os.environ["AR_TRACE"])
+
+
+def merge(output, inputs):
+    events = []
+    for path in inputs:
+        with open(path) as f:
+            events.extend(json.load(f)["traceEvents"])
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "merge":
+        sys.exit("usage: python -m common.trace merge OUTPUT INPUT [INPUT ...]")
+    merge(sys.argv[2], sys.argv[3:])
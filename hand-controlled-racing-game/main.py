@@ -1,12 +1,23 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import os
 import random
+import sys
 import time
 
-# Initialize MediaPipe Hands
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import metrics, trace
+from common.capture import open_capture
+from common.pacing import FramePacer
+
+# Initialize MediaPipe Hands (AR_TRACKER=tflite runs the models directly)
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7)
+if os.environ.get("AR_TRACKER") == "tflite":
+    from common.tflite_tracker import TFLiteHands
+    hands = TFLiteHands(max_num_hands=1, min_detection_confidence=0.7)
+else:
+    hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7)
 mp_draw = mp.solutions.drawing_utils
 
 # Load assets
@@ -33,7 +44,8 @@ spawn_interval = 1.5
 speed_increase_interval = 20  # Score to increase difficulty
 
 # Initialize webcam
-cap = cv2.VideoCapture(0)
+cap = open_capture(0)
+pacer = FramePacer(cap)
 cv2.namedWindow("Hand-Controlled Racing Game", cv2.WINDOW_NORMAL)
 
 def create_obstacle(frame_width):
@@ -54,6 +66,7 @@ last_spawn_time = time.time()
 while True:
     success, img = cap.read()
     if not success:
+        pacer.capture_failed()  # back off instead of spinning on a dead camera
         continue
 
     img = cv2.flip(img, 1)
@@ -62,7 +75,9 @@ while True:
     img = cv2.addWeighted(img, 0.5, background_img, 0.5, 0)  # Overlay background
 
     rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb_img)
+    with trace.span("hands.process"), metrics.inference_seconds.time():
+        results = hands.process(rgb_img)
+    metrics.record_detection(results.multi_hand_landmarks)
     
     hand_x = w // 2
     if results.multi_hand_landmarks:
@@ -82,26 +97,27 @@ while True:
         last_spawn_time = time.time()
 
     # Update obstacles
-    active_obstacles = []
-    for obs in obstacles:
-        obs['pos'][1] += obs['speed']
+    with trace.span("obstacles", count=len(obstacles)):
+        active_obstacles = []
+        for obs in obstacles:
+            obs['pos'][1] += obs['speed']
         
-        # Collision detection
-        if h - car_height < obs['pos'][1] < h:
-            if abs(obs['pos'][0] - hand_x) < car_width // 2:
-                misses += 1
-                obs['active'] = False
-            else:
-                score += 10
-                obs['active'] = False
+            # Collision detection
+            if h - car_height < obs['pos'][1] < h:
+                if abs(obs['pos'][0] - hand_x) < car_width // 2:
+                    misses += 1
+                    obs['active'] = False
+                else:
+                    score += 10
+                    obs['active'] = False
         
-        if obs['pos'][1] > h:
-            obs['active'] = False
+            if obs['pos'][1] > h:
+                obs['active'] = False
         
-        if obs['active']:
-            active_obstacles.append(obs)
-            img[obs['pos'][1]:obs['pos'][1]+obstacle_height, obs['pos'][0]:obs['pos'][0]+obstacle_width] = obstacle_img
-    obstacles = active_obstacles
+            if obs['active']:
+                active_obstacles.append(obs)
+                img[obs['pos'][1]:obs['pos'][1]+obstacle_height, obs['pos'][0]:obs['pos'][0]+obstacle_width] = obstacle_img
+        obstacles = active_obstacles
 
     # Draw car (controlled by hand position)
     img[h - car_height:h, hand_x - car_width // 2:hand_x + car_width // 2] = car_img
@@ -115,17 +131,24 @@ while True:
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
 
     # Game over condition
+    metrics.set_state("GAMEOVER" if misses >= max_misses else "PLAYING")
     if misses >= max_misses:
         cv2.putText(img, "GAME OVER! Press 'R' to restart", (50, h//2), 
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
     
-    cv2.imshow("Hand-Controlled Racing Game", img)
+    with trace.span("cv2.imshow"):
+        cv2.imshow("Hand-Controlled Racing Game", img)
+    metrics.on_display()
 
-    key = cv2.waitKey(1)
+    # Sleep until the next camera frame is due instead of polling
+    with trace.span("cv2.waitKey"):
+        key = pacer.wait_key()
     if key == ord('q'):
         break
     elif key == ord('r'):
         reset_game()
+    elif key == ord('t'):
+        trace.toggle()
 
 cap.release()
 cv2.destroyAllWindows()
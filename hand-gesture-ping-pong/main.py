@@ -1,21 +1,38 @@
 import cv2
 import numpy as np
-import mediapipe as mp
 import pygame
+import os
+import sys
 import time
 
-# ----- Initialize Pygame for sound -----
-pygame.init()
-pygame.mixer.init()
-hit_sound = pygame.mixer.Sound("hit.wav")
-lose_sound = pygame.mixer.Sound("lose.mp3")
-hit_sound.set_volume(1.0)
-lose_sound.set_volume(1.0)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import metrics, trace
+from common.audio import open_audio
+from common.capture import open_capture
+from common.pacing import FramePacer
 
-# ----- Initialize Mediapipe Hand Tracking -----
-mp_hands = mp.solutions.hands
-hands_detector = mp_hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.7)
-mp_drawing = mp.solutions.drawing_utils
+# ----- Initialize Pygame and sound -----
+pygame.init()
+# Clips are decoded up front and played from a small-buffer mixer; the game
+# over sound outranks hits when all voices are busy.
+audio = open_audio({"hit": ("hit.wav", 1), "lose": ("lose.mp3", 2)})
+
+# ----- Initialize Hand Tracking -----
+# AR_TRACKER=markers follows coloured paddles/gloves instead of running
+# Mediapipe, for stations that are too slow for it. AR_TRACKER=tflite runs the
+# Mediapipe models directly with a configurable thread count.
+tracker_backend = os.environ.get("AR_TRACKER", "mediapipe")
+if tracker_backend == "markers":
+    from common import markers
+    marker_tracker = markers.from_env()
+elif tracker_backend == "tflite":
+    from common.tflite_tracker import TFLiteHands
+    hands_detector = TFLiteHands(min_detection_confidence=0.7, min_tracking_confidence=0.7)
+else:
+    import mediapipe as mp
+    mp_hands = mp.solutions.hands
+    hands_detector = mp_hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.7)
+    mp_drawing = mp.solutions.drawing_utils
 
 # ----- Game Parameters -----
 window_width, window_height = 1200, 720
@@ -49,7 +66,8 @@ start_gesture_start_time = None
 gesture_required_duration = 1.0
 
 # ----- OpenCV Video Capture -----
-cap = cv2.VideoCapture(0)
+cap = open_capture(0)
+pacer = FramePacer(cap)
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, window_width)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, window_height)
 
@@ -109,13 +127,20 @@ while True:
     dt = current_time - last_time
     last_time = current_time
 
-    key = cv2.waitKey(1) & 0xFF
+    with trace.span("cv2.waitKey"):
+        key = cv2.waitKey(1) & 0xFF
 
-    # Process Mediapipe hand detection in states where gesture is needed.
+    # Process hand detection in states where gesture is needed.
     if game_state in ["START", "PLAYING", "GAMEOVER"]:
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = hands_detector.process(rgb_frame)
-        hand_pos = detect_hand_position(rgb_frame, results)
+        if tracker_backend == "markers":
+            with trace.span("markers.detect"), metrics.inference_seconds.time():
+                hand_pos = marker_tracker.detect(frame)
+        else:
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            with trace.span("hands.process"), metrics.inference_seconds.time():
+                results = hands_detector.process(rgb_frame)
+            hand_pos = detect_hand_position(rgb_frame, results)
+        metrics.record_detection(hand_pos["Left"] is not None or hand_pos["Right"] is not None)
     else:
         hand_pos = {"Left": None, "Right": None}
 
@@ -165,11 +190,11 @@ while True:
         if (ball_position[0] - ball_radius <= left_rod_x + rod_width and
             left_rod_y <= ball_position[1] <= left_rod_y + rod_height):
             ball_speed[0] = -ball_speed[0]
-            hit_sound.play()
+            audio.play("hit")
             hit_animation_time = current_time
             score[0] += 1  # Left player's score increases on hit
         elif ball_position[0] - ball_radius <= 0:
-            lose_sound.play()
+            audio.play("lose")
             game_state = "GAMEOVER"
             winner = "Right"
             if max(score) > high_score:
@@ -180,11 +205,11 @@ while True:
         if (ball_position[0] + ball_radius >= right_rod_x - rod_width and
             right_rod_y <= ball_position[1] <= right_rod_y + rod_height):
             ball_speed[0] = -ball_speed[0]
-            hit_sound.play()
+            audio.play("hit")
             hit_animation_time = current_time
             score[1] += 1  # Right player's score increases on hit
         elif ball_position[0] + ball_radius >= window_width:
-            lose_sound.play()
+            audio.play("lose")
             game_state = "GAMEOVER"
             winner = "Left"
             if max(score) > high_score:
@@ -233,12 +258,21 @@ while True:
         else:
             restart_gesture_start_time = None
 
-    cv2.imshow("Game", frame)
+    with trace.span("cv2.imshow", state=game_state):
+        cv2.imshow("Game", frame)
+    metrics.on_display()
+    metrics.set_state(game_state)
     pygame.event.pump()
 
+    # Sleep until the next camera frame is due instead of polling
+    pacer.wait()
+
     if key == ord('q'):
         break
+    elif key == ord('t') or key == ord('T'):
+        trace.toggle()
 
 cap.release()
+audio.close()
 cv2.destroyAllWindows()
 pygame.quit()
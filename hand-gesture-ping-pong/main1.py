@@ -2,15 +2,24 @@
 import cv2
 import numpy as np
 import pygame
+import os
+import sys
 import time
 
-# ----- Initialize Pygame for sound -----
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import markers, metrics, trace
+from common.audio import open_audio
+from common.capture import open_capture
+from common.pacing import FramePacer
+
+# ----- Initialize Pygame and sound -----
 pygame.init()
-pygame.mixer.init()
-hit_sound = pygame.mixer.Sound("hit.wav")
-lose_sound = pygame.mixer.Sound("lose.mp3")
-hit_sound.set_volume(1.0)
-lose_sound.set_volume(1.0)
+# Clips are decoded up front and played from a small-buffer mixer; the game
+# over sound outranks hits when all voices are busy.
+audio = open_audio({"hit": ("hit.wav", 1), "lose": ("lose.mp3", 2)})
+
+# ----- Colour-marker tracking (coloured paddles or gloves) -----
+marker_tracker = markers.from_env()
 
 # ----- Game Parameters -----
 window_width, window_height = 800, 600
@@ -32,7 +41,8 @@ game_state = "START"
 hit_animation_time = 0
 hit_flash_duration = 0.2
 
-cap = cv2.VideoCapture(0)
+cap = open_capture(0)
+pacer = FramePacer(cap)
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, window_width)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, window_height)
 
@@ -78,11 +88,21 @@ while True:
     dt = current_time - last_time
     last_time = current_time
 
-    key = cv2.waitKey(1) & 0xFF
+    with trace.span("cv2.waitKey"):
+        key = cv2.waitKey(1) & 0xFF
 
-    # For this version, rod positions remain fixed (centered vertically)
+    # Rods follow the coloured markers on each half of the frame while
+    # playing, and stay centered when a marker isn't visible.
     left_rod_y = window_height//2 - rod_height//2
     right_rod_y = window_height//2 - rod_height//2
+    if game_state == "PLAYING":
+        with trace.span("markers.detect"), metrics.inference_seconds.time():
+            hand_pos = marker_tracker.detect(frame)
+        metrics.record_detection(hand_pos["Left"] is not None or hand_pos["Right"] is not None)
+        if hand_pos["Left"]:
+            left_rod_y = hand_pos["Left"][1] - rod_height//2
+        if hand_pos["Right"]:
+            right_rod_y = hand_pos["Right"][1] - rod_height//2
 
     if game_state == "START":
         frame = show_start_screen(frame)
@@ -102,11 +122,11 @@ while True:
         if (ball_position[0] - ball_radius <= left_rod_x + rod_width and
             left_rod_y <= ball_position[1] <= left_rod_y + rod_height):
             ball_speed[0] = -ball_speed[0]
-            hit_sound.play()
+            audio.play("hit")
             hit_animation_time = current_time
         elif ball_position[0] - ball_radius <= 0:
             score[1] += 1
-            lose_sound.play()
+            audio.play("lose")
             game_state = "GAMEOVER"
             winner = "Right"
             if max(score) > high_score:
@@ -115,11 +135,11 @@ while True:
         if (ball_position[0] + ball_radius >= right_rod_x - rod_width and
             right_rod_y <= ball_position[1] <= right_rod_y + rod_height):
             ball_speed[0] = -ball_speed[0]
-            hit_sound.play()
+            audio.play("hit")
             hit_animation_time = current_time
         elif ball_position[0] + ball_radius >= window_width:
             score[0] += 1
-            lose_sound.play()
+            audio.play("lose")
             game_state = "GAMEOVER"
             winner = "Left"
             if max(score) > high_score:
@@ -157,12 +177,21 @@ while True:
             ball_speed = [4, 2]
             game_state = "PLAYING"
 
-    cv2.imshow("Game", frame)
+    with trace.span("cv2.imshow", state=game_state):
+        cv2.imshow("Game", frame)
+    metrics.on_display()
+    metrics.set_state(game_state)
     pygame.event.pump()
 
+    # Sleep until the next camera frame is due instead of polling
+    pacer.wait()
+
     if key == ord('q'):
         break
+    elif key == ord('t') or key == ord('T'):
+        trace.toggle()
 
 cap.release()
+audio.close()
 cv2.destroyAllWindows()
 pygame.quit()
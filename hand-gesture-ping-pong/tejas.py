@@ -1,12 +1,24 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import os
 import random
+import sys
 import time
+from collections import deque
 
-# Initialize MediaPipe Hands
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import metrics, trace
+from common.capture import open_capture
+from common.pacing import FramePacer
+
+# Initialize MediaPipe Hands (AR_TRACKER=tflite runs the models directly)
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7)
+if os.environ.get("AR_TRACKER") == "tflite":
+    from common.tflite_tracker import TFLiteHands
+    hands = TFLiteHands(max_num_hands=1, min_detection_confidence=0.7)
+else:
+    hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7)
 mp_draw = mp.solutions.drawing_utils
 
 # Game variables
@@ -23,7 +35,8 @@ spawn_interval = 0.5  # Initial bubble spawn interval
 speed_increase_interval = 30  # Points needed to increase difficulty
 
 # Initialize webcam
-cap = cv2.VideoCapture(0)
+cap = open_capture(0)
+pacer = FramePacer(cap)
 cv2.namedWindow("Bubble Catching Game", cv2.WINDOW_NORMAL)
 
 def create_bubble(frame_width):
@@ -40,17 +53,20 @@ def reset_game():
 
 reset_game()
 last_bubble_time = time.time()
-performance_history = []
+performance_history = deque(maxlen=10)  # Only the last 10 catches/misses are used
 
 while True:
     success, img = cap.read()
     if not success:
+        pacer.capture_failed()  # back off instead of spinning on a dead camera
         continue
 
     img = cv2.flip(img, 1)
     h, w, _ = img.shape
     rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb_img)
+    with trace.span("hands.process"), metrics.inference_seconds.time():
+        results = hands.process(rgb_img)
+    metrics.record_detection(results.multi_hand_landmarks)
     
     hand_x = None
     if results.multi_hand_landmarks:
@@ -75,30 +91,31 @@ while True:
     bubbles = active_bubbles  # Remove inactive bubbles
 
     # Update bubble positions
-    for bubble in bubbles:
-        bubble['pos'][1] += bubble['speed']
+    with trace.span("bubbles", count=len(bubbles)):
+        for bubble in bubbles:
+            bubble['pos'][1] += bubble['speed']
         
-        # Catch detection
-        if hand_x and (bubble['pos'][1] + bubble_size > h - basket_height):
-            if (bubble['pos'][0] > hand_x - basket_width//2 and 
-                bubble['pos'][0] < hand_x + basket_width//2):
-                score += 10
-                bubble['active'] = False
-                performance_history.append(1)  # Track successes
+            # Catch detection
+            if hand_x and (bubble['pos'][1] + bubble_size > h - basket_height):
+                if (bubble['pos'][0] > hand_x - basket_width//2 and 
+                    bubble['pos'][0] < hand_x + basket_width//2):
+                    score += 10
+                    bubble['active'] = False
+                    performance_history.append(1)  # Track successes
         
-        # Miss detection
-        if bubble['pos'][1] > h:
-            missed_bubbles += 1
-            bubble['active'] = False
-            performance_history.append(0)  # Track misses
+            # Miss detection
+            if bubble['pos'][1] > h:
+                missed_bubbles += 1
+                bubble['active'] = False
+                performance_history.append(0)  # Track misses
         
-        # Draw active bubbles
-        if bubble['active']:
-            # Fix: Ensure center coordinates are integers
-            cv2.circle(img, (int(bubble['pos'][0]), int(bubble['pos'][1])), bubble_size, (255, 0, 255), -1)
+            # Draw active bubbles
+            if bubble['active']:
+                # Fix: Ensure center coordinates are integers
+                cv2.circle(img, (int(bubble['pos'][0]), int(bubble['pos'][1])), bubble_size, (255, 0, 255), -1)
 
     # Adaptive difficulty based on performance (last 10 catches)
-    recent_performance = performance_history[-10:]
+    recent_performance = performance_history
     if len(recent_performance) > 5:
         success_rate = sum(recent_performance)/len(recent_performance)
         # Auto-adjust speed based on player skill
@@ -123,17 +140,24 @@ while True:
                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
 
     # Game over check
+    metrics.set_state("GAMEOVER" if missed_bubbles >= max_misses else "PLAYING")
     if missed_bubbles >= max_misses:
         cv2.putText(img, "GAME OVER! Press 'R' to restart", (50, h//2), 
                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
 
-    cv2.imshow("Bubble Catching Game", img)
+    with trace.span("cv2.imshow"):
+        cv2.imshow("Bubble Catching Game", img)
+    metrics.on_display()
 
-    key = cv2.waitKey(1)
+    # Sleep until the next camera frame is due instead of polling
+    with trace.span("cv2.waitKey"):
+        key = pacer.wait_key()
     if key == ord('q'):
         break
     elif key == ord('r'):
         reset_game()
+    elif key == ord('t'):
+        trace.toggle()
 
 cap.release()
 cv2.destroyAllWindows()
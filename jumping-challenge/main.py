@@ -1,11 +1,27 @@
 import cv2
 import mediapipe as mp
 import pygame
+import os
 import random
+import sys
 
-# Initialize MediaPipe Pose
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import metrics, trace
+from common.capture import open_capture
+from common.pacing import FramePacer
+from common.pose import ZonePoseTracker, split_zones
+
+# Number of players standing side by side (1-4), e.g. AR_PLAYERS=3
+num_players = max(1, min(4, int(os.environ.get("AR_PLAYERS", "1"))))
+
+# Initialize MediaPipe Pose (one tracker per player zone; AR_TRACKER=tflite
+# runs the models directly)
 mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
+if os.environ.get("AR_TRACKER") == "tflite":
+    from common.tflite_tracker import TFLitePose as make_pose
+else:
+    make_pose = mp_pose.Pose
+pose_tracker = ZonePoseTracker(num_players, make_pose, mp_pose.PoseLandmark.NOSE)
 
 # Initialize Pygame
 pygame.init()
@@ -22,32 +38,56 @@ RED = (255, 0, 0)
 BROWN = (139, 69, 19)  # Wood block color
 GRAY = (169, 169, 169)  # Stone color
 BLACK = (0, 0, 0)  # Wall color
+PLAYER_COLORS = [GREEN, (0, 191, 255), (255, 215, 0), (255, 105, 180)]
 
 # Player settings (AR Object)
 player_size = 50
-player_x = WIDTH // 2  # Start at center
-player_y = HEIGHT - 100  # Near bottom
+ground_y = HEIGHT - 100  # Near bottom
 jump_threshold = 50  # Minimum jump height detection
-jumping = False
 gravity = 3
 jump_force = -15
-velocity_y = 0
+
+# Each player gets a lane: the part of the screen matching their camera zone
+lanes = split_zones(WIDTH, num_players)
+players = []
+for i, (lane_x0, lane_x1) in enumerate(lanes):
+    players.append({
+        'lane': (lane_x0, lane_x1),
+        'x': (lane_x0 + lane_x1) // 2 - player_size // 2,  # Start at lane center
+        'y': ground_y,
+        'jumping': False,
+        'velocity_y': 0,
+        'previous_y': None,  # To track head position for jump detection
+        'score': 0,
+        'hit': False,  # Already hit by the current obstacle
+        'color': PLAYER_COLORS[i],
+    })
 
 # Obstacle settings
 obstacle_width = 80
 obstacle_height = 40
-obstacle_x = random.choice([WIDTH // 4, WIDTH // 2, 3 * WIDTH // 4])  # Random left/middle/right
-obstacle_y = 0  # Start from top
+# Random left/middle/right of each lane
+obstacle_positions = [x0 + k * (x1 - x0) // 4 for x0, x1 in lanes for k in (1, 2, 3)]
 obstacle_speed = 5
-obstacle_type = random.choice(["side", "full"])  # "side" for left/right, "full" for fullscreen jump
-obstacle_appearance = random.choice(["wall", "stone", "wood"])  # Random obstacle structure
+
+def reset_obstacle():
+    # Start a new obstacle at the top with a new type and appearance
+    global obstacle_x, obstacle_y, obstacle_type, obstacle_appearance
+    obstacle_y = 0
+    obstacle_x = random.choice(obstacle_positions)
+    obstacle_type = random.choice(["side", "full"])  # "side" for left/right, "full" for fullscreen jump
+    obstacle_appearance = random.choice(["wall", "stone", "wood"])  # Random obstacle structure
+    for player in players:
+        player['hit'] = False
+
+reset_obstacle()
 
 # Score
-score = 0
-previous_y = None  # To track head position for jump detection
+font = pygame.font.Font(None, 36)
 
 # OpenCV Video Capture
-cap = cv2.VideoCapture(0)
+cap = open_capture(0)
+pacer = FramePacer(cap)
 
 running = True
 while running:
@@ -58,62 +98,71 @@ while running:
     frame = cv2.flip(frame, 1)  # Mirror effect
     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-    # Process with MediaPipe Pose
-    results = pose.process(rgb_frame)
-
-    # Detect head position
-    head_x, head_y = None, None
-    if results.pose_landmarks:
-        head_x = results.pose_landmarks.landmark[mp_pose.PoseLandmark.NOSE].x * WIDTH
-        head_y = results.pose_landmarks.landmark[mp_pose.PoseLandmark.NOSE].y * HEIGHT
-
-    # Set initial previous_y
-    if previous_y is None and head_y is not None:
-        previous_y = head_y
-
-    # Detect jump (if head moves up suddenly)
-    if head_y and not jumping and head_y < previous_y - jump_threshold:
-        jumping = True
-        velocity_y = jump_force
-
-    # Apply jump physics
-    if jumping:
-        player_y += velocity_y
-        velocity_y += gravity
-        if player_y >= HEIGHT - 100:  # Stop falling at ground level
-            player_y = HEIGHT - 100
-            jumping = False  # Reset jump
-
-    # Move player left/right based on head movement
-    if head_x:
-        if head_x < WIDTH // 3:
-            player_x -= 5  # Move left
-        elif head_x > 2 * WIDTH // 3:
-            player_x += 5  # Move right
-
-    # Keep player inside screen
-    player_x = max(0, min(WIDTH - player_size, player_x))
+    # Process with MediaPipe Pose, one crop per player
+    heads = pose_tracker.process(rgb_frame, cap.frame_id)
+
+    for player, head in zip(players, heads):
+        lane_x0, lane_x1 = player['lane']
+        lane_width = lane_x1 - lane_x0
+
+        # Detect head position
+        head_x, head_y = None, None
+        if head is not None:
+            head_x = head[0] * WIDTH
+            head_y = head[1] * HEIGHT
+
+        # Set initial previous_y
+        if player['previous_y'] is None and head_y is not None:
+            player['previous_y'] = head_y
+
+        # Detect jump (if head moves up suddenly)
+        if head_y and not player['jumping'] and head_y < player['previous_y'] - jump_threshold:
+            player['jumping'] = True
+            player['velocity_y'] = jump_force
+
+        # Apply jump physics
+        if player['jumping']:
+            player['y'] += player['velocity_y']
+            player['velocity_y'] += gravity
+            if player['y'] >= ground_y:  # Stop falling at ground level
+                player['y'] = ground_y
+                player['jumping'] = False  # Reset jump
+
+        # Move player left/right based on head movement within their zone
+        if head_x:
+            if head_x < lane_x0 + lane_width // 3:
+                player['x'] -= 5  # Move left
+            elif head_x > lane_x0 + 2 * lane_width // 3:
+                player['x'] += 5  # Move right
+
+        # Keep player inside their lane
+        player['x'] = max(lane_x0, min(lane_x1 - player_size, player['x']))
 
     # Move obstacle down
     obstacle_y += obstacle_speed
 
-    # If obstacle reaches the bottom, reset it with a new type and appearance
+    # If obstacle reaches the bottom, everyone it missed dodged it: score and reset it
     if obstacle_y > HEIGHT:
-        obstacle_y = 0
-        obstacle_x = random.choice([WIDTH // 4, WIDTH // 2, 3 * WIDTH // 4])
-        obstacle_type = random.choice(["side", "full"])
-        obstacle_appearance = random.choice(["wall", "stone", "wood"])
+        for player in players:
+            if not player['hit']:
+                player['score'] += 1
+        reset_obstacle()
 
     # Convert OpenCV image to Pygame surface
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame = cv2.resize(frame, (WIDTH, HEIGHT))
-    frame_surface = pygame.surfarray.make_surface(frame)
-    frame_surface = pygame.transform.rotate(frame_surface, -90)
-    frame_surface = pygame.transform.flip(frame_surface, True, False)
+    with trace.span("make_surface"):
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = cv2.resize(frame, (WIDTH, HEIGHT))
+        frame_surface = pygame.surfarray.make_surface(frame)
+        frame_surface = pygame.transform.rotate(frame_surface, -90)
+        frame_surface = pygame.transform.flip(frame_surface, True, False)
 
     # Pygame rendering
     screen.blit(frame_surface, (0, 0))  # Display live camera feed
 
+    # Lane dividers between players
+    for lane_x0, _ in lanes[1:]:
+        pygame.draw.line(screen, WHITE, (lane_x0, 0), (lane_x0, HEIGHT), 2)
+
     # Determine obstacle color based on type
     if obstacle_appearance == "wall":
         obstacle_color = BLACK
@@ -128,40 +177,52 @@ while running:
     else:
         pygame.draw.rect(screen, obstacle_color, (0, obstacle_y, WIDTH, obstacle_height))  # Full-screen obstacle
 
-    # Draw player
-    pygame.draw.rect(screen, GREEN, (player_x, player_y, player_size, player_size))
-
-    # Collision Detection
-    if (
-        obstacle_type == "side"
-        and obstacle_y + obstacle_height >= player_y  # If obstacle reaches player
-        and player_x < obstacle_x + obstacle_width
-        and player_x + player_size > obstacle_x
-    ):
-        print(f"❌ Hit by {obstacle_appearance.upper()}! Game Over!")
-        score = 0  # Reset score
-
-    elif (
-        obstacle_type == "full"
-        and obstacle_y + obstacle_height >= player_y  # If full-screen obstacle reaches player
-        and not jumping  # If player didn't jump in time
-    ):
-        print(f"❌ Hit by {obstacle_appearance.upper()}! Game Over!")
-        score = 0  # Reset score
-
-    # Display Score
-    font = pygame.font.Font(None, 36)
-    score_text = font.render(f"Score: {score}", True, (0, 255, 0))
-    screen.blit(score_text, (10, 10))
+    for i, player in enumerate(players):
+        player_x, player_y = player['x'], player['y']
+
+        # Draw player
+        pygame.draw.rect(screen, player['color'], (player_x, player_y, player_size, player_size))
+
+        # Collision Detection (each obstacle can hit a player only once)
+        if player['hit']:
+            pass
+        elif (
+            obstacle_type == "side"
+            and obstacle_y + obstacle_height >= player_y  # If obstacle reaches player
+            and obstacle_y <= player_y + player_size  # and hasn't passed below it yet
+            and player_x < obstacle_x + obstacle_width
+            and player_x + player_size > obstacle_x
+        ) or (
+            obstacle_type == "full"
+            and obstacle_y + obstacle_height >= player_y  # If full-screen obstacle reaches player
+            and obstacle_y <= player_y + player_size
+            and not player['jumping']  # If player didn't jump in time
+        ):
+            print(f"❌ Player {i + 1} hit by {obstacle_appearance.upper()}! Game Over!")
+            player['score'] = 0  # Reset score
+            player['hit'] = True
+
+        # Display Score
+        score_text = font.render(f"P{i + 1}: {player['score']}" if num_players > 1
+                                 else f"Score: {player['score']}", True, player['color'])
+        screen.blit(score_text, (player['lane'][0] + 10, 10))
 
     # Event Handling
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_t:
+            trace.toggle()
+
+    with trace.span("display.flip"):
+        pygame.display.flip()
+    metrics.on_display()
 
-    pygame.display.flip()
+    # Sleep until the next camera frame is due instead of looping flat out
+    pacer.wait()
 
 # Cleanup
 cap.release()
+pose_tracker.close()
 cv2.destroyAllWindows()
 pygame.quit()